@@ -33,4 +33,4 @@ setup(name="dpp2xmp",
           "Programming Language :: Python :: 2.7",
           "Programming Language :: Python :: 3",
           "Topic :: Multimedia"],
-      py_modules=["dpp2xmp"])
+      py_modules=["dpp2xmp", "archive", "cache", "crop", "geometry", "inventory", "merge", "record", "scheduler", "supervisor", "tracing", "triage", "whitebalance", "writer"])
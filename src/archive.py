@@ -0,0 +1,205 @@
+"""
+Ship sidecars to another host as one stream instead of many small files.
+
+An ArchiveWriter takes the place of writer.Writer and packs each sidecar,
+under its path relative to a root directory, into a tar stream or JSON
+lines. A manifest of content hashes from earlier runs means only sidecars
+whose content changed are sent. unpack() applies such a stream at the
+destination, skipping sidecars that are already identical there.
+
+The manifest records a sidecar as sent once it is packed, not once it is
+applied: if an archive never reaches the destination, or unpack fails
+there, those sidecars are not sent again until their content changes.
+Packing with a fresh manifest (--resend) sends everything again.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import sys
+import tarfile
+import time
+
+from tracing import NULL_TRACE
+from writer import write_atomic
+
+FORMATS = ('tar', 'jsonl')
+
+
+def content_hash(content):
+    return hashlib.sha1(content).hexdigest()
+
+
+def file_hash(filename):
+    try:
+        with open(filename, 'rb') as f:
+            return content_hash(f.read())
+    except IOError:
+        return None
+
+
+def safe_path(root, relative):
+    """
+    Join a path from an archive onto root, refusing any that would land
+    outside of it.
+    """
+    if os.path.isabs(relative) or os.pardir in relative.split('/'):
+        raise ValueError('Unsafe path in archive: {!r}'.format(relative))
+    return os.path.join(root, *relative.split('/'))
+
+
+class Manifest(object):
+    """
+    The content hash of every sidecar packed so far, by relative path, kept
+    in a text file of "hash path" lines. With fresh, the hashes already in
+    the file are ignored, so everything is sent, and then replaced on save.
+    """
+
+    def __init__(self, path, fresh=False):
+        self.path = path
+        self.hashes = {}
+        if path and not fresh and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    digest, _, relative = line.rstrip('\n').partition(' ')
+                    self.hashes[relative] = digest
+
+    def changed(self, relative, digest):
+        return self.hashes.get(relative) != digest
+
+    def update(self, relative, digest):
+        self.hashes[relative] = digest
+
+    def save(self):
+        if not self.path:
+            return
+        lines = ['{} {}\n'.format(digest, relative)
+                 for relative, digest in sorted(self.hashes.iteritems())]
+        write_atomic(self.path, ''.join(lines))
+
+
+class ArchiveWriter(object):
+    """
+    Accepts the same calls as writer.Writer, but packs sidecars into out.
+    """
+
+    def __init__(self, out, format='tar', root='.', manifest=None,
+                 stats=None):
+        if format not in FORMATS:
+            raise ValueError('format must be one of {}, was {!r}'.format(
+                ', '.join(FORMATS), format))
+        self.out = out
+        self.format = format
+        self.root = os.path.abspath(root)
+        self.manifest = manifest
+        if stats is None:
+            stats = collections.Counter()
+        self.stats = stats
+        self._tar = None
+        if format == 'tar':
+            self._tar = tarfile.open(fileobj=out, mode='w|')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def relative(self, filename):
+        relative = os.path.relpath(os.path.abspath(filename), self.root)
+        if relative.split(os.sep)[0] == os.pardir:
+            raise ValueError('{} is outside of {}'.format(filename, self.root))
+        return relative.replace(os.sep, '/')
+
+    def write(self, filename, content, callback=None, trace=NULL_TRACE):
+        try:
+            relative = self.relative(filename)
+        except ValueError as e:
+            print >> sys.stderr, 'Could not archive {}'.format(e)
+            self.stats['archive errors'] += 1
+            return
+        digest = content_hash(content)
+        if self.manifest is not None:
+            if not self.manifest.changed(relative, digest):
+                self.stats['unchanged'] += 1
+                if callback is not None:
+                    callback()
+                return
+            self.manifest.update(relative, digest)
+        with trace.span('write'):
+            if self._tar is not None:
+                info = tarfile.TarInfo(relative)
+                info.size = len(content)
+                info.mtime = time.time()
+                info.mode = 0o644
+                self._tar.addfile(info, StringReader(content))
+            else:
+                self.out.write(json.dumps(
+                    {'path': relative, 'content': content}) + '\n')
+        self.stats['archived'] += 1
+        if callback is not None:
+            callback()
+
+    def close(self):
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+        self.out.flush()
+        if self.manifest is not None:
+            self.manifest.save()
+
+
+class StringReader(object):
+    """
+    Just enough of a file for tarfile.addfile to read content from
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self.offset = 0
+
+    def read(self, size=-1):
+        if size < 0:
+            size = len(self.content) - self.offset
+        data = self.content[self.offset:self.offset + size]
+        self.offset += len(data)
+        return data
+
+
+def read_archive(stream, format='tar'):
+    """
+    Yield (relative path, content) for each sidecar in an archive stream
+    """
+    if format == 'tar':
+        tar = tarfile.open(fileobj=stream, mode='r|')
+        for member in tar:
+            if member.isfile():
+                yield member.name, tar.extractfile(member).read()
+        tar.close()
+    else:
+        for line in stream:
+            if line.strip():
+                entry = json.loads(line)
+                yield entry['path'], entry['content'].encode('utf-8')
+
+
+def unpack(stream, writer, format='tar', root='.'):
+    """
+    Write each sidecar in stream under root through writer, skipping those
+    whose content is already there.
+    """
+    for relative, content in read_archive(stream, format):
+        try:
+            filename = safe_path(root, relative)
+        except ValueError as e:
+            print >> sys.stderr, e
+            writer.stats['archive errors'] += 1
+            continue
+        if file_hash(filename) == content_hash(content):
+            writer.stats['unchanged'] += 1
+            continue
+        directory = os.path.dirname(filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        writer.write(filename, content)
@@ -0,0 +1,47 @@
+"""
+A small least-recently-used cache for conversion results.
+"""
+
+import collections
+
+
+class LRUCache(object):
+    """
+    A mapping that holds at most `size` entries, forgetting the least
+    recently used one when it is full.
+    """
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        if key not in self._entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        value = self._entries.pop(key)
+        self._entries[key] = value
+        return value
+
+    def put(self, key, value):
+        if key in self._entries:
+            self._entries.pop(key)
+        elif len(self._entries) >= self.size:
+            self._entries.popitem(last=False)
+        self._entries[key] = value
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        if not lookups:
+            return 0.0
+        return self.hits / float(lookups)
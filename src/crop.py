@@ -0,0 +1,127 @@
+"""
+Convert DPP crop rectangles into XMP crop values.
+
+DPP stores a crop as a box (top, left, height, width) in pixels of the image
+as displayed, plus an angle. XMP wants the upper left and lower right corners
+of the angled crop box as fractions of the stored (unrotated) image.
+"""
+
+import collections
+
+import geometry
+
+ORIENTATION_MAPPINGS = {
+    1: 'Horizontal (normal)',
+    2: 'Mirror horizontal',
+    3: 'Rotate 180',
+    4: 'Mirror vertical',
+    5: 'Mirror horizontal and rotate 270 CW',
+    6: 'Rotate 90 CW',
+    7: 'Mirror horizontal and rotate 90 CW',
+    8: 'Rotate 270 CW',
+}
+
+# Affine transforms (a, b, c, d, e, f) taking a fractional point (u, v) of
+# the displayed image to the stored image:
+#   x = a * u + b * v + c
+#   y = d * u + e * v + f
+ORIENTATION_TRANSFORMS = {
+    1: (1, 0, 0, 0, 1, 0),
+    2: (-1, 0, 1, 0, 1, 0),
+    3: (-1, 0, 1, 0, -1, 1),
+    4: (1, 0, 0, 0, -1, 1),
+    5: (0, 1, 0, 1, 0, 0),
+    6: (0, 1, 0, -1, 0, 1),
+    7: (0, -1, 1, -1, 0, 1),
+    8: (0, -1, 1, 1, 0, 0),
+}
+
+# Orientations that swap width and height when displayed
+TRANSPOSED = frozenset([5, 6, 7, 8])
+# Orientations that reverse the direction of an angle when displayed
+MIRRORED = frozenset([2, 4, 5, 7])
+
+ORIENTATION_CODES = dict(
+    (name, code) for code, name in ORIENTATION_MAPPINGS.items())
+
+# DPP angles have a resolution of a hundredth of a degree
+ANGLE_STEPS = 100
+
+XMPCrop = collections.namedtuple(
+    'XMPCrop', ['top', 'left', 'bottom', 'right', 'angle'])
+
+
+def orientation_code(orientation):
+    """
+    Accept an EXIF orientation as either its number or exiftool's name for it
+    """
+    if orientation in ORIENTATION_MAPPINGS:
+        return orientation
+    return ORIENTATION_CODES.get(orientation, 1)
+
+
+def clamp(value):
+    return min(max(value, 0.0), 1.0)
+
+
+class CropEngine(object):
+    """
+    Computes XMP crops, keeping one rotation per quantized angle so the
+    trigonometry is only done once per distinct DPP angle.
+    """
+
+    def __init__(self):
+        self._rotations = {}
+
+    def rotation(self, degrees):
+        step = int(round(float(degrees) * ANGLE_STEPS))
+        rotation = self._rotations.get(step)
+        if rotation is None:
+            rotation = geometry.RotationDegrees(step / float(ANGLE_STEPS))
+            self._rotations[step] = rotation
+        return rotation
+
+    def crop(self, height, width, orientation, top, left, crop_height,
+             crop_width, degrees):
+        """
+        height and width are of the stored image; the crop box is relative
+        to the top left corner of the displayed image.
+        Returns an XMPCrop with fractional, clamped edges.
+        See the formula from Steve Sprengel:
+        http://feedback.photoshop.com/photoshop_family/topics/lightroom_
+        camera_raw_dng_xmp_what_is_the_formula_for_converting_crop_coordinates
+        _when_photo_gets_angled
+        """
+        code = orientation_code(orientation)
+        displayed_height, displayed_width = height, width
+        if code in TRANSPOSED:
+            displayed_height, displayed_width = width, height
+
+        # Build the box in the stored image, so that its upper left and lower
+        # right corners are the ones XMP means rather than some other
+        # diagonal. Mirroring reverses the direction of the angle.
+        a, b, c, d, e, f = ORIENTATION_TRANSFORMS[code]
+        u = (left + crop_width / 2.0) / displayed_width
+        v = (top + crop_height / 2.0) / displayed_height
+        if code in TRANSPOSED:
+            crop_height, crop_width = crop_width, crop_height
+        degrees = float(degrees)
+        if code in MIRRORED:
+            degrees = -degrees
+
+        # geometry works with y pointing up, images with y pointing down, so
+        # flip the y axis and the direction of the angle.
+        center = geometry.Point((a * u + b * v + c) * width,
+                                -(d * u + e * v + f) * height)
+        box = geometry.Rectangle(center, crop_height, crop_width,
+                                 self.rotation(-degrees))
+        xs = []
+        ys = []
+        for point in (box.upper_left, box.lower_right):
+            xs.append(point.x / width)
+            ys.append(-point.y / height)
+
+        # "or 0.0" avoids writing -0.0
+        angle = -degrees or 0.0
+        return XMPCrop(clamp(min(ys)), clamp(min(xs)),
+                       clamp(max(ys)), clamp(max(xs)), angle)
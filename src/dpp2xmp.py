@@ -1,128 +1,36 @@
 from __future__ import division
 
-import math
+import argparse
+import collections
+import cStringIO
 import exiftool
+import functools
 import glob
+import os
 import re
+import sys
+
+from archive import FORMATS as ARCHIVE_FORMATS, ArchiveWriter, Manifest
+from archive import unpack as unpack_archive
+from cache import LRUCache
+from crop import CropEngine
+from inventory import CAMERA_FIELDS, FORMATS as INVENTORY_FORMATS
+from inventory import PICTURE_STYLES, InventoryWriter
+from merge import MergeError, merge_sidecar, quote
+from record import Record
+from scheduler import PRIORITIES, Scheduler
+from supervisor import Checklist, Supervisor
+from tracing import NULL_TRACE, Tracer
+from triage import NO_VRD_ACTIONS, has_vrd
+from whitebalance import WhiteBalanceTable, normalize_temperature_and_tint
+from writer import Writer
 
 # http://www.exiv2.org/tags-xmp-crs.html
 # http://wwwimages.adobe.com/www.adobe.com/content/dam/Adobe/en/devnet/xmp/pdfs/cs6/XMPSpecificationPart2.pdf
 # http://www.sno.phy.queensu.ca/~phil/exiftool/TagNames/CanonVRD.html
 # http://www.adobe.com/content/dam/Adobe/en/devnet/xmp/pdfs/XMPSpecificationPart1.pdf
 
-
-class Image(object):
-
-    def __init__(self, height, width, orientation):
-        self.height = height
-        self.width = width
-        self.orientation = orientation
-
-        self.cropTop = 0
-        self.cropLeft = 0
-        self.cropHeight = height
-        self.cropWidth = width
-        self.cropDegrees = 0
-        self.hasCrop = 0
-
-    def cropDpp(self, top, left, height, width, degrees):
-        """
-        Set the image's crop settings.
-        The x,y and height and width are relative to the top left corner
-        of a bounding box around the original image
-        """
-        self.cropHeight = height
-        self.cropWidth = width
-        self.cropTop = top
-        self.cropLeft = left
-        self.cropDegrees = (float(degrees) + 360) % 360
-
-    def get_top_left_of_bounding(self):
-        # x_ = self.cropTop
-        pass
-
-    def getXMPCrop(self):
-        # rotate -45 to 45 degrees (True angle opposite sign from UI)
-        # uses basic formula for translating to polar coordinates, setting the
-        # angle, then translating back.
-        #[[ *** formula from Steve Sprengel
-        # ref:  http://feedback.photoshop.com/photoshop_family/topics/lightroom_
-        # camera_raw_dng_xmp_what_is_the_formula_for_converting_crop_coordinates
-        # _when_photo_gets_angled
-        # ref2:
-        # http://answers.yahoo.com/question/index?qid=20100314163944AAIu9xk
-        # x_prime = x * Cos(theta) - y * Sin(theta) + a
-        # y_prime = x * Sin(theta) + y * Cos(theta) + b
-        #]]
-
-        # fractional
-        sin = math.sin(math.radians(self.cropDegrees))
-        cos = math.cos(math.radians(self.cropDegrees))
-
-        yBottomRightAbsolute = self.cropTop + self.cropHeight
-        xBottonRightAbsolute = self.cropLeft + self.cropWidth
-
-        # x, y -> coordinates, in pixels, of upper l corner of crop box,
-        #  relative to center of crop box (and hence, center of rotation).
-        xUpperLeft = -self.cropWidth / 2
-        yUpperLeft = -self.cropHeight / 2
-        xUpperRight = self.cropWidth / 2
-        yUpperRight = -self.cropHeight / 2
-        # xLowerLeft = -self.cropWidth / 2
-        # yLowerLeft = self.cropHeight / 2
-        xLowerRight = self.cropWidth / 2
-        yLowerRight = self.cropHeight / 2
-
-        # xT, yT -> angled coordinates, transformed according to angle, but
-        # still relative to center of rotation/crop-box.
-        xUpperLeftT = xUpperLeft * cos - yUpperLeft * sin
-        # yUpperLeftT = xUpperLeft * sin + yUpperLeft * cos
-
-        # xUpperRightT = xUpperRight * cos - yUpperRight * sin
-        yUpperRightT = xUpperRight * sin + yUpperRight * cos
-
-        # xLowerLeftT = xLowerLeft * cos - yLowerLeft * sin
-        # yLowerLeftT = xLowerLeft * sin + yLowerLeft * cos
-
-        xLowerRightT = xLowerRight * cos - yLowerRight * sin
-        yLowerRightT = xLowerRight * sin + yLowerRight * cos
-
-        # xP, yP -> angled coordinates, in pixels, relative to upper l corner
-        # of image.
-        cropLeftPixelsP = self.cropLeft + (xUpperLeftT - xUpperLeft)
-        cropTopPixelsP = self.cropTop + (yUpperRightT - yUpperLeft)
-        cropRightPixelsP = xBottonRightAbsolute + (xLowerRightT - xLowerRight)
-        cropBottomPixelsP = yBottomRightAbsolute + (yLowerRightT - yLowerRight)
-
-        # final coordinates, as fractional values.
-        left = cropLeftPixelsP / self.width
-        top = cropTopPixelsP / self.height
-        top = self.cropTop / self.height
-        right = cropRightPixelsP / self.width
-        bottom = cropBottomPixelsP / self.height
-        if left < 0:
-            left = 0
-        if right > 1:
-            right = 1
-        if top < 0:
-            top = 0
-        if bottom > 1:
-            bottom = 1
-        print self.cropLeft, self.cropTop, self.cropLeft + self.cropWidth, self.cropTop + self.cropHeight
-        print cropLeftPixelsP, cropTopPixelsP, cropRightPixelsP, cropBottomPixelsP
-        return top, left, bottom, right
-
-
-ORIENTATION_MAPPINGS = {
-    1: 'Horizontal (normal)',
-    2: 'Mirror horizontal',
-    3: 'Rotate 180',
-    4: 'Mirror vertical',
-    5: 'Mirror horizontal and rotate 270 CW',
-    6: 'Rotate 90 CW',
-    7: 'Mirror horizontal and rotate 90 CW',
-    8: 'Rotate 270 CW',
-}
+CROP_ENGINE = CropEngine()
 
 
 FIELDS = set(re.split('\s+', '''tiff:Make
@@ -167,18 +75,6 @@ FIELDS = set(re.split('\s+', '''tiff:Make
    xmpMM:OriginalDocumentID
    xmpMM:InstanceID'''))
 
-PICTURE_STYLES = {
-    0: 'Standard',
-    1: 'Portrait',
-    2: 'Landscape',
-    3: 'Neutral',
-    4: 'Faithful',
-    5: 'Monochrome',
-    6: 'Unknown?',
-    7: 'Custom',
-}
-
-
 WHITE_BALANCE_MAPPINGS = {
     0: 'As Shot',
     1: 'Daylight',
@@ -194,7 +90,7 @@ WHITE_BALANCE_MAPPINGS = {
     'Daylight': 'Daylight',
     'Cloudy': 'Cloudy',
     'Tungsten': 'Tungsten',
-    'Fluorescent': 'Flourescent',
+    'Fluorescent': 'Fluorescent',
     'Flash': 'Flash',
     'Shade': 'Shade',
     'Kelvin': 'Custom',
@@ -202,6 +98,47 @@ WHITE_BALANCE_MAPPINGS = {
     'Shot Settings': 'As Shot',
 }
 
+# EXIF only says whether the camera chose the white balance itself
+EXIF_WHITE_BALANCE_MAPPINGS = {
+    0: 'As Shot',
+    1: 'As Shot',
+    'Auto': 'As Shot',
+    'Manual': 'As Shot',
+}
+
+MAKERNOTES_WHITE_BALANCE_MAPPINGS = {
+    0: 'As Shot',
+    1: 'Daylight',
+    2: 'Cloudy',
+    3: 'Tungsten',
+    4: 'Fluorescent',
+    5: 'Flash',
+    6: 'Custom',
+    8: 'Shade',
+    9: 'Custom',
+    14: 'Fluorescent',
+    15: 'Custom',
+    16: 'Custom',
+    18: 'Custom',
+    19: 'Custom',
+    23: 'As Shot',
+    'Auto': 'As Shot',
+    'Daylight': 'Daylight',
+    'Cloudy': 'Cloudy',
+    'Tungsten': 'Tungsten',
+    'Fluorescent': 'Fluorescent',
+    'Flash': 'Flash',
+    'Custom': 'Custom',
+    'Shade': 'Shade',
+    'Manual Temperature (Kelvin)': 'Custom',
+    'Daylight Fluorescent': 'Fluorescent',
+    'Custom 1': 'Custom',
+    'Custom 2': 'Custom',
+    'Custom 3': 'Custom',
+    'Custom 4': 'Custom',
+    'Auto (ambience priority)': 'As Shot',
+}
+
 CRS = {
     'AlreadyApplied': {'type': bool, 'values': [False, True], 'default': False},
     'AutoLateralCA': {'type': int, 'values': [False, True], 'default': False},
@@ -384,12 +321,19 @@ REAL_CRS = {
         'type': str,
         'values': [
             'As Shot', 'Daylight', 'Cloudy', 'Shade', 'Tungsten',
-            'Flourescent', 'Flash', 'Custom'
+            'Fluorescent', 'Flash', 'Custom'
         ],
         'default': 'As Shot',
     },
 }
 ALL_CRS = dict(CRS.items() + REAL_CRS.items() + CRS_2012.items())
+# each source of a white balance numbers them its own way
+WHITE_BALANCE_TABLES = {
+    'CanonVRD:WhiteBalanceAdj': WhiteBalanceTable(WHITE_BALANCE_MAPPINGS),
+    'EXIF:WhiteBalance': WhiteBalanceTable(EXIF_WHITE_BALANCE_MAPPINGS),
+    'MakerNotes:WhiteBalance': WhiteBalanceTable(
+        MAKERNOTES_WHITE_BALANCE_MAPPINGS),
+}
 CROP_MAPPINGS = {
     False: False,
     True: True,
@@ -455,56 +399,203 @@ MAPPINGS = {
 LIKELY_MAPPINGS = {}
 
 
-def process_metadata(metadata):
+# each mapping with its sources, in the order they are looked for
+MAPPING_ORDER = tuple(
+    (mapping, tuple(MAPPINGS[mapping])) for mapping in sorted(MAPPINGS))
+MAPPING_SOURCES = frozenset(
+    source for sources in MAPPINGS.values() for source in sources)
+ORIENTATION_SOURCES = ('tiff:Orientation', 'EXIF:Orientation')
+# fields kept in a record's recipe; the camera fields are only reported
+RECIPE_SOURCES = MAPPING_SOURCES | frozenset(CAMERA_FIELDS)
+
+
+def find_mapping(metadata, mapping):
+    """
+    Return the value of the first source of a mapping found in metadata
+    """
+    for source in MAPPINGS[mapping]:
+        if source in metadata:
+            return metadata[source]
+    return None
+
+
+def extract_record(metadata):
+    """
+    Reduce an exiftool metadata dict to a Record. Frames sharing a pasted DPP
+    recipe produce equal recipes.
+    """
+    return Record.from_metadata(metadata, RECIPE_SOURCES, ORIENTATION_SOURCES)
+
+
+def resolve_recipe(recipe):
+    """
+    Promote the settings of the recipe's picture style, then pick the source
+    each mapping takes its value from. Returns the promoted recipe as a dict
+    and a tuple of (mapping, source, value), sorted by mapping.
+    """
+    metadata = dict(recipe)
     picture_style = metadata.get('CanonVRD:PictureStyle')
     if picture_style:
         if picture_style in PICTURE_STYLES:
             picture_style = PICTURE_STYLES[picture_style]
             picture_key = 'CanonVRD:' + picture_style
-            for key, setting in metadata.items():
+            for key, setting in recipe:
                 if key.startswith(picture_key):
                     new_key = key.replace(picture_key, 'CanonVRD:')
-                    metadata[new_key] = metadata[key]
-    for mapping, sources in MAPPINGS.items():
-        found = False
+                    metadata[new_key] = setting
+    values = []
+    for mapping, sources in MAPPING_ORDER:
         for source in sources:
             if source in metadata:
-                metadata['crs:' + mapping] = metadata[source]
-                print source, metadata[source], '->', mapping, metadata['crs:' + mapping]
-                found = True
+                values.append((mapping, source, metadata[source]))
                 break
-        if not found:
-            print 'Not found: {} {}'.format(mapping, sources)
-
-    if 'crs:CropAngle' in metadata:
+    return metadata, tuple(values)
+
+
+def conversion_key(record, recipe):
+    """
+    Key what conversion reads: the CanonVRD: fields, the value of each
+    mapping that comes from a camera field, and the orientation. Promoting a
+    picture style only adds CanonVRD: fields, so these decide the result
+    without resolving the recipe. Frames whose recipes differ only in camera
+    fields a CanonVRD: value overrides share a key. recipe is record.recipe
+    as a dict.
+    """
+    vrd = tuple(item for item in record.recipe
+                if item[0].startswith('CanonVRD:'))
+    camera = []
+    for mapping, sources in MAPPING_ORDER:
+        for source in sources:
+            if source in recipe:
+                if not source.startswith('CanonVRD:'):
+                    camera.append((source, recipe[source]))
+                break
+    return vrd, tuple(camera), record.orientation
+
+
+def convert_resolved(metadata, values, height, width, orientation,
+                     trace=NULL_TRACE, unknown=None):
+    """
+    Convert a recipe into a dict of crs: fields, given what resolve_recipe
+    made of it. This is a pure function of its arguments, so results can be
+    shared between images with the same recipe, dimensions and orientation.
+    Values replaced by a default are added to the list unknown as
+    (source, value). trace only records how long the crop took.
+    """
+    crs = {}
+    sources = {}
+    for mapping, source, value in values:
+        crs['crs:' + mapping] = value
+        sources[mapping] = source
+
+    if 'crs:CropAngle' in crs:
         # the number is inverted for dpp versus xmp
-        metadata['crs:CropAngle'] *= -1
-
-    if 'CanonVRD:WhiteBalanceAdj' in metadata:
-        metadata['crs:WhiteBalance'] = WHITE_BALANCE_MAPPINGS[
-            metadata['CanonVRD:WhiteBalanceAdj']]
-    metadata['crs:HasCrop'] = CROP_MAPPINGS[
+        crs['crs:CropAngle'] *= -1
+
+    if 'crs:WhiteBalance' in crs:
+        source = sources['WhiteBalance']
+        if 'CanonVRD:WhiteBalanceAdj' in metadata:
+            source = 'CanonVRD:WhiteBalanceAdj'
+        table = WHITE_BALANCE_TABLES[source]
+        white_balance = table.find(metadata[source])
+        if white_balance is None:
+            white_balance = table.fallback
+            if unknown is not None:
+                unknown.append((source, metadata[source]))
+        crs['crs:WhiteBalance'] = white_balance
+    normalize_temperature_and_tint(
+        crs, REAL_CRS['Temperature']['values'], REAL_CRS['Tint']['values'])
+    crs['crs:HasCrop'] = CROP_MAPPINGS[
         metadata.get('CanonVRD:CropActive', False)]
-    height = metadata['crs:ImageHeight']
-    width = metadata['crs:ImageWidth']
-    orientation = metadata.get('tiff:Orientation', 'Horizontal (normal)')
-    if metadata['crs:HasCrop']:
+    if crs['crs:HasCrop']:
         croptop = metadata.get('CanonVRD:CropTop', 0)
         cropheight = metadata.get('CanonVRD:CropHeight', height)
         cropleft = metadata.get('CanonVRD:CropLeft', 0)
         cropwidth = metadata.get('CanonVRD:CropWidth', width)
         degrees = metadata.get('CanonVRD:AngleAdj', 0)
-        image = Image(height, width, orientation)
-        image.cropDpp(croptop, cropleft, cropheight, cropwidth, degrees)
-        t, l, b, r = image.getXMPCrop()
-        metadata['crs:CropTop'] = round(t, 6)
-        metadata['crs:CropLeft'] = round(l, 6)
-        metadata['crs:CropBottom'] = round(b, 6)
-        metadata['crs:CropRight'] = round(r, 6)
+        with trace.span('crop'):
+            crop = CROP_ENGINE.crop(height, width, orientation, croptop,
+                                    cropleft, cropheight, cropwidth, degrees)
+        crs['crs:CropTop'] = round(crop.top, 6)
+        crs['crs:CropLeft'] = round(crop.left, 6)
+        crs['crs:CropBottom'] = round(crop.bottom, 6)
+        crs['crs:CropRight'] = round(crop.right, 6)
+        crs['crs:CropAngle'] = crop.angle
+    return crs
+
+
+def process_record(record, cache=None, trace=NULL_TRACE, stats=None):
+    """
+    Set record.crs, reusing a cached conversion when an identical recipe has
+    been seen before. Values that could not be converted are counted in
+    stats, once for every record they are in.
+    """
+    recipe = dict(record.recipe)
+    height = find_mapping(recipe, 'ImageHeight')
+    width = find_mapping(recipe, 'ImageWidth')
+    if height is None or width is None:
+        raise KeyError('No image dimensions found')
+    key = cached = None
+    if cache is not None:
+        with trace.span('cache') as span:
+            key = conversion_key(record, recipe)
+            try:
+                cached = cache.get(key)
+            except TypeError:
+                # exiftool gave a list or some other unhashable value
+                key = cached = None
+            span.set(hit=cached is not None)
+    if cached is None:
+        metadata, values = resolve_recipe(record.recipe)
+        unknown = []
+        crs = convert_resolved(metadata, values, height, width,
+                               record.orientation, trace, unknown)
+        if key is not None:
+            cache.put(key, (crs, tuple(unknown)))
+    else:
+        crs, unknown = cached
+    if stats is not None:
+        for source, value in unknown:
+            stats['unknown {} {!r}'.format(source, value)] += 1
+    record.crs = crs
+    return record
+
+
+def process_metadata(metadata, cache=None):
+    """
+    Add crs: fields to an exiftool metadata dict
+    """
+    record = process_record(extract_record(metadata), cache)
+    metadata.update(record.crs)
     return metadata
 
 
+def print_stats(stats, cache, out=sys.stdout):
+    for name, count in sorted(stats.items()):
+        print >> out, '{}: {}'.format(name, count)
+    print >> out, 'recipe cache: {} hits, {} misses, {:.1%} hit rate'.format(
+        cache.hits, cache.misses, cache.hit_rate)
+
+
+def is_raw(filename):
+    return filename.endswith('.cr2') or filename.endswith('.crw')
+
+
+def check_vrd(filename):
+    """
+    Whether filename may have DPP edits. Files that cannot be read are
+    left for exiftool to report on.
+    """
+    try:
+        return has_vrd(filename)
+    except (IOError, OSError):
+        return True
+
+
 def format_field(k, v):
+    if isinstance(v, unicode):
+        # exiftool gives text as unicode; sidecars are written as UTF-8
+        v = v.encode('utf-8')
     if k not in ALL_CRS:
         return str(v)
     f = ALL_CRS[k]['type']
@@ -519,68 +610,328 @@ def format_field(k, v):
     return v
 
 
-def metadata_to_fields(metadata):
-    lines = []
-    whitelist = [
-        'xmp', 'tiff', 'exif', 'dc', 'aux', 'photoshop', 'xmpMM', 'stEvt', 'crs'
-    ]
-    for k, v in metadata.items():
-        if ':' not in k:
-            continue
-        group, w = k.split(':')
-        if group.lower() in whitelist:
-            group = group.lower()
-            k = '{}:{}'.format(group, w)
-        if group in whitelist:
-            lines.append('{}="{}"'.format(k, format_field(k, v)))
+def record_to_attributes(record):
+    """
+    Return the sorted (name, value) pairs to write for a record, including
+    defaults for any crs: fields it does not set
+    """
+    fields = dict(record.passthrough)
+    if record.crs:
+        fields.update(record.crs)
+    attributes = [(k, str(format_field(k, v))) for k, v in fields.iteritems()]
     for k, definition in ALL_CRS.items():
         k = 'crs:' + k
-        if k in metadata:
-            continue
-        else:
-            lines.append('{}="{}"'.format(
-                k, format_field(k, definition['default'])))
-    lines = sorted(lines)
-    fields = "\r\n   ".join(lines)
-    return fields
+        if k not in fields:
+            attributes.append((k, str(format_field(k, definition['default']))))
+    return sorted(attributes)
+
+
+def record_to_crs_attributes(record):
+    """
+    Return the sorted (name, value) pairs of the crs: fields converted from
+    a record's recipe, without defaults, so that merging them leaves any
+    other develop settings alone
+    """
+    return sorted((k, str(format_field(k, v)))
+                  for k, v in (record.crs or {}).iteritems())
 
 
-def main(fileglobs):
-    import os
+def record_to_fields(record):
+    lines = ['{}={}'.format(k, quote(v))
+             for k, v in record_to_attributes(record)]
+    return "\r\n   ".join(lines)
+
+
+def metadata_to_fields(metadata):
+    return record_to_fields(extract_record(metadata))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description='Extract DPP edits from Canon raws into XMP sidecars')
+    parser.add_argument('fileglobs', nargs='+', metavar='glob',
+                        help='raw files to convert')
+    parser.add_argument('--resume', action='store_true',
+                        help='skip files finished by a previous run')
+    parser.add_argument('--journal', default='.dpp2xmp.journal',
+                        help='checkpoint journal of finished files')
+    parser.add_argument('--quarantine', default='.dpp2xmp.quarantine',
+                        help='list of files exiftool keeps failing on')
+    parser.add_argument('--timeout', type=float, default=60,
+                        help='seconds to wait for exiftool on each file')
+    parser.add_argument('--attempts', type=int, default=2,
+                        help='tries per file before quarantining it')
+    parser.add_argument('--priority', choices=PRIORITIES, default='glob',
+                        help='which files to convert first')
+    parser.add_argument('--priority-path', action='append',
+                        help='with --priority=paths, a directory to convert '
+                        'before others; may be repeated')
+    parser.add_argument('--max-seconds', type=float,
+                        help='stop taking new files after this long')
+    parser.add_argument('--write-threads', type=int, default=4,
+                        help='threads writing sidecars; 0 writes inline')
+    parser.add_argument('--no-vrd', choices=NO_VRD_ACTIONS, default='skip',
+                        help='what to do with raws DPP never edited: convert '
+                        'them anyway, skip them, or write an empty sidecar')
+    parser.add_argument('--merge', action='store_true',
+                        help='update existing sidecars in place, keeping '
+                        'keywords, ratings and anything else already there; '
+                        'not with --archive')
+    parser.add_argument('--archive', metavar='PATH',
+                        help='pack sidecars into one archive instead of '
+                        'writing them; - for stdout. unpack replaces whole '
+                        'sidecars, so this cannot be combined with --merge')
+    parser.add_argument('--archive-format', choices=ARCHIVE_FORMATS,
+                        default='tar')
+    parser.add_argument('--archive-root', default='.',
+                        help='archived paths are relative to this directory')
+    parser.add_argument('--manifest', default='.dpp2xmp.manifest',
+                        help='hashes of sidecars already archived, so only '
+                        'changed ones are sent again. A sidecar counts as '
+                        'sent once packed, whether or not it was unpacked')
+    parser.add_argument('--resend', action='store_true',
+                        help='with --archive, ignore the manifest and send '
+                        'every sidecar again')
+    parser.add_argument('--trace', metavar='PATH',
+                        help='write a timeline of where the time goes for '
+                        'each file, for chrome://tracing or Perfetto')
+    parser.add_argument('--trace-sample', type=int, default=1, metavar='N',
+                        help='with --trace, trace one file in every N')
+    options = parser.parse_args(argv)
+    if options.merge and options.archive:
+        parser.error('--merge cannot be used with --archive: the sidecars to '
+                     'merge into are on the host that unpacks the archive')
+    return options
+
+
+def main(fileglobs, options=None, factory=None):
+    """
+    Convert raws to sidecars. factory makes the exiftool session, and is
+    exiftool.ExifTool unless something is standing in for it.
+    Returns the run's stats and its recipe cache.
+    """
+    if options is None:
+        options = parse_args(fileglobs)
+        fileglobs = options.fileglobs
+    if factory is None:
+        factory = exiftool.ExifTool
     template = open(os.path.dirname(os.path.abspath(__file__))
                     + '/template.xmp').read()
-    with exiftool.ExifTool() as et:
-        for fileglob in fileglobs:
-            files = [x for x in glob.glob(fileglob) if x.endswith(
-                '.cr2') or x.endswith('.crw')]
-            if not files:
-                print 'No files for glob %s' % fileglob
+    stats = collections.Counter()
+    cache = LRUCache()
+    journal = Checklist(options.journal, keep=options.resume)
+    quarantine = Checklist(options.quarantine)
+    supervisor = Supervisor(factory, timeout=options.timeout,
+                            attempts=options.attempts, quarantine=quarantine,
+                            stats=stats)
+    scheduler = Scheduler(options.priority, paths=options.priority_path,
+                          max_seconds=options.max_seconds)
+    tracer = NULL_TRACE
+    if options.trace:
+        tracer = Tracer(open(options.trace, 'w'), options.trace_sample)
+    for fileglob in fileglobs:
+        with tracer.span('scan', glob=fileglob):
+            files = [x for x in glob.glob(fileglob) if is_raw(x)]
+        if not files:
+            print >> sys.stderr, 'No files for glob %s' % fileglob
+            stats['empty globs'] += 1
+            continue
+        for filename in files:
+            if filename in journal:
+                stats['resumed'] += 1
                 continue
-            for i, filename in enumerate(files):
+            scheduler.add(filename)
+    log = sys.stdout
+    archive = None
+    if options.archive:
+        if options.archive == '-':
+            archive = sys.stdout
+            log = sys.stderr
+        else:
+            archive = open(options.archive, 'wb')
+        writer = ArchiveWriter(archive, options.archive_format,
+                               root=options.archive_root,
+                               manifest=Manifest(options.manifest,
+                                                 fresh=options.resend),
+                               stats=stats)
+    else:
+        writer = Writer(threads=options.write_threads, stats=stats)
+    with supervisor, writer:
+        for filename in scheduler:
+            trace = tracer.file(filename)
+            with trace.span('file'):
                 xmp_filename = filename[0:-3] + 'xmp'
                 replace_xmp = True
                 if os.path.exists(xmp_filename):
                     cr2_mtime = os.path.getmtime(filename)
                     xmp_mtime = os.path.getmtime(xmp_filename)
                     replace_xmp = cr2_mtime > xmp_mtime
-                metadata = et.get_metadata(filename)
-                metadata = process_metadata(metadata)
-                if replace_xmp:
-                    output = template.replace(
-                        '##FIELDS##',
-                        metadata_to_fields(metadata)
-                    )
-                    f = open(xmp_filename, 'w')
-                    f.write(output)
-                    f.close()
-                else:
-                    # pprint.pprint(metadata)
-                    pass
+                if options.no_vrd != 'convert' and not check_vrd(filename):
+                    keep = options.merge and os.path.exists(xmp_filename)
+                    if options.no_vrd == 'minimal' and replace_xmp and not keep:
+                        stats['no vrd, minimal sidecar'] += 1
+                        writer.write(xmp_filename,
+                                     template.replace('##FIELDS##', ''),
+                                     functools.partial(journal.add, filename),
+                                     trace)
+                    else:
+                        stats['no vrd, skipped'] += 1
+                        journal.add(filename)
+                    continue
+                if not replace_xmp:
+                    stats['up to date'] += 1
+                    journal.add(filename)
+                    continue
+                with trace.span('extraction'):
+                    metadata = supervisor.get_metadata(filename)
+                if metadata is None:
+                    continue
+                with trace.span('mapping'):
+                    try:
+                        record = process_record(extract_record(metadata),
+                                                cache, trace, stats)
+                    except KeyError as e:
+                        print >> sys.stderr, 'Could not convert {}: {}'.format(
+                            filename, e)
+                        stats['no dimensions'] += 1
+                        quarantine.add(filename)
+                        continue
+                del metadata
+                stats['files'] += 1
+                with trace.span('format'):
+                    if options.merge and os.path.exists(xmp_filename):
+                        out = cStringIO.StringIO()
+                        try:
+                            merge_sidecar(
+                                xmp_filename,
+                                record_to_crs_attributes(record), out)
+                        except (MergeError, IOError) as e:
+                            print >> sys.stderr, \
+                                'Could not merge into {}: {}'.format(
+                                    xmp_filename, e)
+                            stats['merge failures'] += 1
+                            continue
+                        output = out.getvalue()
+                        stats['merged'] += 1
+                    else:
+                        output = template.replace(
+                            '##FIELDS##',
+                            record_to_fields(record)
+                        )
+                writer.write(xmp_filename, output,
+                             functools.partial(journal.add, filename),
+                             trace)
+    if scheduler.expired:
+        print >> log, 'Stopped after {}s'.format(options.max_seconds)
+        stats['deferred'] += len(scheduler)
+    if archive is not None and archive is not sys.stdout:
+        archive.close()
+    journal.close()
+    quarantine.close()
+    tracer.close()
+    print_stats(stats, cache, log)
+    return stats, cache
+
+
+def parse_inventory_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='dpp2xmp.py inventory',
+        description='List the DPP edits in Canon raws without writing XMP')
+    parser.add_argument('fileglobs', nargs='+', metavar='glob',
+                        help='raw files to report on')
+    parser.add_argument('--format', choices=INVENTORY_FORMATS,
+                        default='jsonl')
+    parser.add_argument('--output', help='file to write; default is stdout')
+    parser.add_argument('--timeout', type=float, default=60,
+                        help='seconds to wait for exiftool on each file')
+    parser.add_argument('--attempts', type=int, default=2,
+                        help='tries per file before giving up on it')
+    parser.add_argument('--triage', action='store_true',
+                        help='report raws without a CanonVRD trailer as '
+                        'unedited without running exiftool on them')
+    return parser.parse_args(argv)
+
+
+def inventory(argv):
+    """
+    Stream one inventory row per raw file, including those that could not
+    be read, with a status saying why. Files are read one glob match at a
+    time and nothing is kept per file, so memory stays constant.
+    """
+    options = parse_inventory_args(argv)
+    stats = collections.Counter()
+    cache = LRUCache()
+    supervisor = Supervisor(exiftool.ExifTool, timeout=options.timeout,
+                            attempts=options.attempts, stats=stats)
+    out = sys.stdout
+    if options.output:
+        out = open(options.output, 'w')
+    writer = InventoryWriter(out, options.format)
+    with supervisor:
+        for fileglob in options.fileglobs:
+            for filename in glob.iglob(fileglob):
+                if not is_raw(filename):
+                    continue
+                if options.triage and not check_vrd(filename):
+                    writer.write(filename, None, 'no vrd')
+                    stats['no vrd'] += 1
+                    continue
+                metadata = supervisor.get_metadata(filename)
+                if metadata is None:
+                    writer.write(filename, None, 'exiftool failed')
+                    continue
+                record = extract_record(metadata)
+                try:
+                    process_record(record, cache, stats=stats)
+                except KeyError:
+                    # still report what DPP did to it
+                    writer.write(filename, record, 'no dimensions')
+                    stats['no dimensions'] += 1
+                    continue
+                writer.write(filename, record)
+                stats['files'] += 1
+    if out is not sys.stdout:
+        out.close()
+    print_stats(stats, cache, sys.stderr)
+
+
+def parse_unpack_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='dpp2xmp.py unpack',
+        description='Write out sidecars packed with --archive')
+    parser.add_argument('archive', nargs='?', default='-',
+                        help='archive to read; default is stdin')
+    parser.add_argument('--format', choices=ARCHIVE_FORMATS, default='tar')
+    parser.add_argument('--root', default='.',
+                        help='directory the archived paths are relative to')
+    parser.add_argument('--write-threads', type=int, default=4,
+                        help='threads writing sidecars; 0 writes inline')
+    return parser.parse_args(argv)
+
+
+def unpack(argv):
+    options = parse_unpack_args(argv)
+    stats = collections.Counter()
+    stream = sys.stdin
+    if options.archive != '-':
+        stream = open(options.archive, 'rb')
+    with Writer(threads=options.write_threads, stats=stats) as writer:
+        unpack_archive(stream, writer, options.format, options.root)
+    if stream is not sys.stdin:
+        stream.close()
+    for name, count in sorted(stats.items()):
+        print '{}: {}'.format(name, count)
+
+
+COMMANDS = {
+    'inventory': inventory,
+    'unpack': unpack,
+}
 
 if __name__ == '__main__':
-    import sys
-    fileglobs = sys.argv[1:]
-    if not fileglobs:
-        print 'No files specified'
-        exit(1)
-    main(fileglobs)
+    args = sys.argv[1:]
+    if args and args[0] in COMMANDS:
+        COMMANDS[args[0]](args[1:])
+    else:
+        options = parse_args(args)
+        main(options.fileglobs, options)
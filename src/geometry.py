@@ -155,12 +155,10 @@ class Rectangle(object):
         return self.upper_left - self.lower_right
 
     def _corner(self, right, up):
-        cr = math.cos(self.rotation.radians)
-        sr = math.sin(self.rotation.radians)
-
-        x = right * cr - up * sr
-        y = right * sr + up * cr
-        point = Point(x, y)
+        # A rotation is a unit complex number, so multiplying by it rotates
+        # without recomputing any trigonometry.
+        unit = complex(self.rotation) / abs(self.rotation)
+        point = Point(complex(right, up) * unit)
         return self.center + point
 
     @property
@@ -0,0 +1,149 @@
+"""
+Report which raws carry DPP edits, one row per file, without writing XMP.
+"""
+
+import csv
+import json
+
+VRD_FIELDS = (
+    'CanonVRD:CropActive',
+    'CanonVRD:CropLeft',
+    'CanonVRD:CropTop',
+    'CanonVRD:CropWidth',
+    'CanonVRD:CropHeight',
+    'CanonVRD:AngleAdj',
+    'CanonVRD:WhiteBalanceAdj',
+    'CanonVRD:WBAdjColorTemp',
+    'CanonVRD:PictureStyle',
+)
+# fields of the camera's own settings that edits are compared against
+CAMERA_FIELDS = (
+    'MakerNotes:PictureStyle',
+)
+CRS_FIELDS = (
+    'crs:HasCrop',
+    'crs:CropTop',
+    'crs:CropLeft',
+    'crs:CropBottom',
+    'crs:CropRight',
+    'crs:CropAngle',
+    'crs:WhiteBalance',
+    'crs:Temperature',
+)
+COLUMNS = ('file', 'status', 'edits') + VRD_FIELDS + CAMERA_FIELDS + CRS_FIELDS
+FORMATS = ('jsonl', 'csv')
+
+# CanonVRD:PictureStyle numbers, named as the CanonVRD: fields holding
+# each style's settings are
+PICTURE_STYLES = {
+    0: 'Standard',
+    1: 'Portrait',
+    2: 'Landscape',
+    3: 'Neutral',
+    4: 'Faithful',
+    5: 'Monochrome',
+    6: 'Unknown?',
+    7: 'Custom',
+}
+# the camera numbers them differently, and has three user defined styles
+CAMERA_PICTURE_STYLES = {
+    0x21: 'Custom',
+    0x22: 'Custom',
+    0x23: 'Custom',
+    0x81: 'Standard',
+    0x82: 'Portrait',
+    0x83: 'Landscape',
+    0x84: 'Neutral',
+    0x85: 'Faithful',
+    0x86: 'Monochrome',
+    0x87: 'Auto',
+}
+
+
+def picture_style_name(value, names):
+    """
+    Name a picture style given as a number from names, or by exiftool's
+    name for it
+    """
+    if isinstance(value, basestring):
+        if value.startswith('User Def'):
+            return 'Custom'
+        return value
+    return names.get(value)
+
+
+def picture_style_edited(recipe):
+    """
+    DPP records a picture style for every file it saves, so it is only an
+    edit when it differs from the style the camera shot with. Without the
+    camera's style there is nothing to compare, and no edit is reported.
+    """
+    if 'CanonVRD:PictureStyle' not in recipe:
+        return False
+    shot = picture_style_name(
+        recipe.get('MakerNotes:PictureStyle'), CAMERA_PICTURE_STYLES)
+    if shot is None:
+        return False
+    return picture_style_name(
+        recipe['CanonVRD:PictureStyle'], PICTURE_STYLES) != shot
+
+
+def find_edits(recipe, crs):
+    """
+    Name the kinds of DPP edit present, given a recipe dict and crs: fields
+    """
+    edits = []
+    if crs.get('crs:HasCrop'):
+        edits.append('crop')
+    if recipe.get('CanonVRD:AngleAdj'):
+        edits.append('angle')
+    if 'CanonVRD:WhiteBalanceAdj' in recipe and \
+            crs.get('crs:WhiteBalance') != 'As Shot':
+        edits.append('white balance')
+    if picture_style_edited(recipe):
+        edits.append('picture style')
+    return edits
+
+
+def inventory_row(filename, record, status='ok'):
+    """
+    status says why a file has no record, or no crs: fields, when that is
+    the case; record may then be None.
+    """
+    recipe = {}
+    crs = {}
+    if record is not None:
+        recipe = dict(record.recipe)
+        crs = record.crs or {}
+    row = {'file': filename, 'status': status,
+           'edits': ' '.join(find_edits(recipe, crs))}
+    for field in VRD_FIELDS + CAMERA_FIELDS:
+        row[field] = recipe.get(field)
+    for field in CRS_FIELDS:
+        row[field] = crs.get(field)
+    return row
+
+
+class InventoryWriter(object):
+    """
+    Writes one row per file to out as soon as it is given, as JSON lines or
+    CSV with a header.
+    """
+
+    def __init__(self, out, format='jsonl'):
+        if format not in FORMATS:
+            raise ValueError('format must be one of {}, was {!r}'.format(
+                ', '.join(FORMATS), format))
+        self.out = out
+        self.format = format
+        self._csv = None
+        if format == 'csv':
+            self._csv = csv.DictWriter(out, COLUMNS)
+            self._csv.writeheader()
+
+    def write(self, filename, record, status='ok'):
+        row = inventory_row(filename, record, status)
+        if self._csv is not None:
+            self._csv.writerow(row)
+        else:
+            self.out.write(json.dumps(row, sort_keys=True) + '\n')
@@ -0,0 +1,212 @@
+"""
+Merge dpp2xmp's fields into an existing XMP sidecar.
+
+The sidecar is fed through expat a chunk at a time. The fields are added to
+the first rdf:Description, and any attribute or child element duplicating
+one is removed from every rdf:Description beside it; exiftool writes one
+per namespace. Every other byte, including the other attributes of a
+rewritten start tag, is copied through unchanged, and is written out as
+soon as no later edit can touch it. Keywords, ratings, labels and anything
+else Lightroom stored survive.
+
+Callers pass only the crs: fields converted from the DPP recipe. Camera
+fields such as xmp:Rating, and develop settings DPP has no equivalent for,
+are Lightroom's to change once a sidecar exists.
+"""
+
+import re
+from xml.parsers import expat
+from xml.sax.saxutils import escape
+
+CHUNK_SIZE = 65536
+
+# the namespaces dpp2xmp writes, as declared in template.xmp
+NAMESPACES = {
+    'tiff': 'http://ns.adobe.com/tiff/1.0/',
+    'exif': 'http://ns.adobe.com/exif/1.0/',
+    'dc': 'http://purl.org/dc/elements/1.1/',
+    'aux': 'http://ns.adobe.com/exif/1.0/aux/',
+    'xmp': 'http://ns.adobe.com/xap/1.0/',
+    'photoshop': 'http://ns.adobe.com/photoshop/1.0/',
+    'xmpMM': 'http://ns.adobe.com/xap/1.0/mm/',
+    'stEvt': 'http://ns.adobe.com/xap/1.0/sType/ResourceEvent#',
+    'crs': 'http://ns.adobe.com/camera-raw-settings/1.0/',
+}
+
+# an attribute of a start tag as written, with the whitespace before it
+ATTRIBUTE = re.compile(r'''(\s+)([^\s=/>]+)\s*=\s*("[^"]*"|'[^']*')''')
+
+
+class MergeError(Exception):
+    pass
+
+
+def quote(value):
+    return '"{}"'.format(escape(value, {'"': '&quot;'}))
+
+
+def tag_end(data, start):
+    """
+    Return the offset just past the '>' closing the tag that starts at
+    start, skipping over any '>' inside quoted attribute values.
+    """
+    quote_char = None
+    for i in xrange(start, len(data)):
+        c = data[i]
+        if quote_char:
+            if c == quote_char:
+                quote_char = None
+        elif c in '"\'':
+            quote_char = c
+        elif c == '>':
+            return i + 1
+    raise MergeError('Unterminated tag at {}'.format(start))
+
+
+def raw_attributes(tag):
+    """
+    Return (name, text) for each attribute of a start tag, where text is
+    exactly as written, so character references in values are kept.
+    """
+    return [(m.group(2), m.group(0)) for m in ATTRIBUTE.finditer(tag)]
+
+
+class Merger(object):
+    """
+    attributes is a list of (name, value) pairs, values already formatted
+    as strings. Feed the existing sidecar in with feed(), then call close();
+    the merged sidecar is written to out as it is produced.
+    """
+
+    def __init__(self, attributes, out):
+        self.attributes = attributes
+        self.owned = set(name for name, value in attributes)
+        self.out = out
+        self.data = ''
+        self.base = 0
+        self.emitted = 0
+        self.last_event = 0
+        self.depth = 0
+        self.target_depth = None
+        self.description_depth = None
+        self.merged = False
+        self.removing = None
+        self.stack = [(frozenset(), None, None)]
+        self.parser = expat.ParserCreate()
+        self.parser.ordered_attributes = True
+        self.parser.StartElementHandler = self.start
+        self.parser.EndElementHandler = self.end
+
+    def _at(self, offset):
+        return offset - self.base
+
+    def flush(self, limit):
+        if limit <= self.emitted:
+            return
+        self.out.write(self.data[self._at(self.emitted):self._at(limit)])
+        self.emitted = limit
+        self.data = self.data[self._at(limit):]
+        self.base = limit
+
+    def replace(self, start, end, replacement):
+        self.flush(start)
+        self.out.write(replacement)
+        self.emitted = end
+
+    def feed(self, chunk):
+        self.data += chunk
+        try:
+            self.parser.Parse(chunk, False)
+        except expat.ExpatError as e:
+            raise MergeError(str(e))
+        limit = self.last_event
+        if self.removing is not None:
+            limit = min(limit, self.removing[0])
+        self.flush(limit)
+
+    def close(self):
+        try:
+            self.parser.Parse('', True)
+        except expat.ExpatError as e:
+            raise MergeError(str(e))
+        if not self.merged:
+            raise MergeError('No rdf:Description found')
+        self.flush(self.base + len(self.data))
+
+    def description_tag(self, tag, declared, self_closing, merge):
+        """
+        Rewrite the start tag of an rdf:Description without the attributes
+        being merged, adding them to it if merge is set.
+        """
+        parts = ['<rdf:Description']
+        parts.extend(text for name, text in raw_attributes(tag)
+                     if name not in self.owned)
+        if merge:
+            lines = []
+            for name, value in self.attributes:
+                prefix = name.partition(':')[0]
+                if prefix not in declared and prefix in NAMESPACES:
+                    lines.append('xmlns:{}={}'.format(
+                        prefix, quote(NAMESPACES[prefix])))
+                    declared.add(prefix)
+            lines.extend('{}={}'.format(name, quote(value))
+                         for name, value in self.attributes)
+            parts.extend('\n    ' + line for line in lines)
+        if self_closing:
+            return ''.join(parts) + '/>'
+        return ''.join(parts) + '>'
+
+    def start(self, name, attributes):
+        index = self.parser.CurrentByteIndex
+        self.last_event = index
+        end = tag_end(self.data, self._at(index)) + self.base
+        self_closing = self.data[self._at(end) - 2] == '/'
+        names = attributes[0::2]
+        declared = set(self.stack[-1][0])
+        for attribute in names:
+            if attribute.startswith('xmlns:'):
+                declared.add(attribute[len('xmlns:'):])
+        self.stack.append((declared, end, self_closing))
+        if name == 'rdf:Description' and self.description_depth in (
+                None, self.depth):
+            merge = not self.merged
+            self.merged = True
+            self.description_depth = self.depth
+            self.target_depth = self.depth
+            if merge or self.owned.intersection(names):
+                tag = self.data[self._at(index):self._at(end)]
+                self.replace(index, end, self.description_tag(
+                    tag, declared, self_closing, merge))
+        elif self.target_depth is not None and self.removing is None \
+                and self.depth == self.target_depth + 1 and name in self.owned:
+            self.removing = (index, self.depth)
+        self.depth += 1
+
+    def end(self, name):
+        self.depth -= 1
+        index = self.parser.CurrentByteIndex
+        declared, start_end, self_closing = self.stack.pop()
+        if self_closing:
+            end = start_end
+        else:
+            end = tag_end(self.data, self._at(index)) + self.base
+        self.last_event = end
+        if self.removing is not None and self.removing[1] == self.depth:
+            self.replace(self.removing[0], end, '')
+            self.removing = None
+        if self.depth == self.target_depth:
+            self.target_depth = None
+
+
+def merge_sidecar(filename, attributes, out):
+    """
+    Write the sidecar in filename to out with attributes merged in
+    """
+    merger = Merger(attributes, out)
+    with open(filename, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            merger.feed(chunk)
+    merger.close()
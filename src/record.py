@@ -0,0 +1,80 @@
+"""
+A compact record of the parts of a file's metadata that dpp2xmp uses.
+
+exiftool returns hundreds of fields per file. A Record keeps only the
+fields conversion reads (the recipe) and the fields copied into the XMP
+(the passthrough), each as a sorted tuple of (key, value) pairs.
+"""
+
+PASSTHROUGH_GROUPS = frozenset([
+    'xmp', 'tiff', 'exif', 'dc', 'aux', 'photoshop', 'xmpMM', 'stEvt', 'crs'
+])
+
+# exiftool uses the same few hundred keys for every file, so remember how
+# each one maps instead of splitting it again.
+_PASSTHROUGH_KEYS = {}
+
+
+def passthrough_key(key):
+    """
+    Return key as it is written in the XMP, or None if it is not written
+    """
+    try:
+        return _PASSTHROUGH_KEYS[key]
+    except KeyError:
+        pass
+    xmp_key = None
+    group, colon, name = key.partition(':')
+    if colon:
+        if group.lower() in PASSTHROUGH_GROUPS:
+            group = group.lower()
+        if group in PASSTHROUGH_GROUPS:
+            xmp_key = '{}:{}'.format(group, name)
+    _PASSTHROUGH_KEYS[key] = xmp_key
+    return xmp_key
+
+
+class Record(object):
+    """
+    recipe: (key, value) pairs conversion depends on
+    orientation: the EXIF orientation, as a number or exiftool's name
+    passthrough: (xmp key, value) pairs copied into the XMP
+    crs: crs: fields computed from the recipe, possibly shared with other
+         records, so never modified in place
+    """
+    __slots__ = ('filename', 'recipe', 'orientation', 'passthrough', 'crs')
+
+    def __init__(self, filename, recipe, orientation, passthrough, crs=None):
+        self.filename = filename
+        self.recipe = recipe
+        self.orientation = orientation
+        self.passthrough = passthrough
+        self.crs = crs
+
+    def __repr__(self):
+        return '<Record {!r}: {} recipe, {} passthrough fields>'.format(
+            self.filename, len(self.recipe), len(self.passthrough))
+
+    @classmethod
+    def from_metadata(cls, metadata, sources, orientation_sources):
+        """
+        Build a record from an exiftool metadata dict. Recipe fields are
+        CanonVRD: fields and any key in sources.
+        """
+        recipe = []
+        passthrough = []
+        for key, value in metadata.iteritems():
+            if key.startswith('CanonVRD:') or key in sources:
+                recipe.append((key, value))
+            xmp_key = passthrough_key(key)
+            if xmp_key is not None:
+                passthrough.append((xmp_key, value))
+        orientation = 'Horizontal (normal)'
+        for source in orientation_sources:
+            if source in metadata:
+                orientation = metadata[source]
+                break
+        recipe.sort()
+        passthrough.sort()
+        return cls(metadata.get('SourceFile'), tuple(recipe), orientation,
+                   tuple(passthrough))
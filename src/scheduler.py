@@ -0,0 +1,80 @@
+"""
+Order pending files so the most important ones are converted first.
+"""
+
+import heapq
+import os
+import time
+
+PRIORITIES = ('glob', 'mtime', 'directory', 'paths')
+
+
+class Scheduler(object):
+    """
+    A heap of pending files.
+
+    priority is one of:
+      glob: the order the files were added in
+      mtime: newest raw first
+      directory: files in the most recently changed directory first
+      paths: files under the earliest matching entry of paths first, then
+             newest raw first
+    If max_seconds is set, iteration stops once that much time has passed
+    since the scheduler was made.
+    """
+
+    def __init__(self, priority='glob', paths=None, max_seconds=None,
+                 clock=time.time):
+        if priority not in PRIORITIES:
+            raise ValueError('priority must be one of {}, was {!r}'.format(
+                ', '.join(PRIORITIES), priority))
+        self.priority = priority
+        self.paths = [os.path.abspath(path) for path in (paths or [])]
+        self.max_seconds = max_seconds
+        self.clock = clock
+        self.started = clock()
+        self.expired = False
+        self._heap = []
+        self._count = 0
+        self._directory_mtimes = {}
+
+    def __len__(self):
+        return len(self._heap)
+
+    def _directory_mtime(self, directory):
+        mtime = self._directory_mtimes.get(directory)
+        if mtime is None:
+            mtime = os.path.getmtime(directory or '.')
+            self._directory_mtimes[directory] = mtime
+        return mtime
+
+    def _path_rank(self, filename):
+        filename = os.path.abspath(filename)
+        for rank, path in enumerate(self.paths):
+            if filename == path or filename.startswith(path + os.sep):
+                return rank
+        return len(self.paths)
+
+    def key(self, filename):
+        if self.priority == 'mtime':
+            return -os.path.getmtime(filename)
+        if self.priority == 'directory':
+            return -self._directory_mtime(os.path.dirname(filename))
+        if self.priority == 'paths':
+            return self._path_rank(filename), -os.path.getmtime(filename)
+        return 0
+
+    def add(self, filename):
+        # the counter keeps equal keys in the order they were added
+        heapq.heappush(self._heap, (self.key(filename), self._count, filename))
+        self._count += 1
+
+    def __iter__(self):
+        deadline = None
+        if self.max_seconds is not None:
+            deadline = self.started + self.max_seconds
+        while self._heap:
+            if deadline is not None and self.clock() >= deadline:
+                self.expired = True
+                return
+            yield heapq.heappop(self._heap)[2]
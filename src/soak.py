@@ -0,0 +1,293 @@
+"""
+Soak test dpp2xmp against a large synthetic library.
+
+Generates raws whose recipes (crops, angles, orientations, white balance,
+picture styles) are stored as JSON behind a CanonVRD signature, runs main()
+over them with a stand-in for exiftool that reads those recipes back, and
+samples throughput, resident memory and open file descriptors while it
+runs, and how often the recipe cache is hit. Any budget that is exceeded
+fails the run. The stand-in runs in this process, so the descriptor counts
+leave out the pipes a real exiftool would hold open.
+
+    python soak.py --files 100000 --min-rate 500 --max-rss-growth 50 \
+        --min-hit-rate 0.8
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import dpp2xmp
+from crop import ORIENTATION_MAPPINGS
+from triage import VRD_SIGNATURE
+
+FILES_PER_DIRECTORY = 1000
+# frames in a burst share a recipe and an orientation
+BURST = 10
+WHITE_BALANCES = [0, 1, 2, 3, 4, 5, 8, 9, 'Auto', 'Daylight', 'Kelvin']
+CAMERA_WHITE_BALANCES = ['Auto', 'Daylight', 'Cloudy', 'Shade']
+
+
+def make_recipe(rng):
+    """
+    A random DPP recipe, as exiftool would report it
+    """
+    recipe = {
+        'CanonVRD:WhiteBalanceAdj': rng.choice(WHITE_BALANCES),
+        'CanonVRD:WBAdjColorTemp': rng.randrange(2500, 10000, 100),
+        'CanonVRD:PictureStyle': rng.randrange(8),
+        'CanonVRD:RawBrightnessAdj': round(rng.uniform(-2, 2), 2),
+        'CanonVRD:ContrastAdj': rng.randrange(-4, 5),
+        'CanonVRD:CropActive': rng.choice(['Yes', 'No']),
+        'CanonVRD:AngleAdj': rng.choice([0, 0, round(rng.uniform(-45, 45), 2)]),
+    }
+    if recipe['CanonVRD:CropActive'] == 'Yes':
+        recipe['CanonVRD:CropLeft'] = rng.randrange(0, 2000)
+        recipe['CanonVRD:CropTop'] = rng.randrange(0, 1500)
+        recipe['CanonVRD:CropWidth'] = rng.randrange(500, 3000)
+        recipe['CanonVRD:CropHeight'] = rng.randrange(500, 1900)
+    return recipe
+
+
+def make_library(root, count, recipes=500, edited=0.8, seed=0):
+    """
+    Write count synthetic raws under root, sharing recipes between bursts
+    of frames the way pasted DPP recipes are, and orientations the way
+    frames shot together do. A fraction 1 - edited of them have no
+    CanonVRD trailer.
+    """
+    rng = random.Random(seed)
+    pool = [make_recipe(rng) for i in range(recipes)]
+    orientation = None
+    for i in range(count):
+        if i % BURST == 0:
+            orientation = rng.choice(ORIENTATION_MAPPINGS.values())
+        directory = os.path.join(root, '{:05d}'.format(i // FILES_PER_DIRECTORY))
+        if i % FILES_PER_DIRECTORY == 0:
+            os.makedirs(directory)
+        metadata = {
+            'EXIF:ExifImageWidth': 5184,
+            'EXIF:ExifImageHeight': 3456,
+            'EXIF:Orientation': orientation,
+            'EXIF:Make': 'Canon',
+            'EXIF:Model': 'Canon EOS 5D Mark III',
+            'EXIF:FNumber': rng.choice([1.4, 2.8, 4, 8, 16]),
+            'EXIF:WhiteBalance': rng.choice(CAMERA_WHITE_BALANCES),
+            'MakerNotes:ColorTemperature': rng.randrange(3000, 8000, 100),
+            'XMP:Rating': rng.randrange(6),
+        }
+        trailer = ''
+        if rng.random() < edited:
+            metadata.update(pool[(i // BURST) % len(pool)])
+            trailer = VRD_SIGNATURE
+        with open(os.path.join(directory, '{:06d}.cr2'.format(i)), 'wb') as f:
+            f.write(json.dumps(metadata) + trailer)
+
+
+class SyntheticExifTool(object):
+    """
+    Stands in for exiftool.ExifTool, reading back what make_library wrote
+    """
+    calls = 0
+
+    def start(self):
+        pass
+
+    def terminate(self):
+        pass
+
+    def get_metadata(self, filename):
+        SyntheticExifTool.calls += 1
+        with open(filename, 'rb') as f:
+            content = f.read()
+        if content.endswith(VRD_SIGNATURE):
+            content = content[:-len(VRD_SIGNATURE)]
+        metadata = json.loads(content)
+        metadata['SourceFile'] = filename
+        return metadata
+
+
+def rss_kb():
+    """
+    Current resident set size, where /proc makes it available
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    return None
+
+
+def peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak //= 1024
+    return peak
+
+
+def open_fds():
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+class Sampler(threading.Thread):
+    """
+    Records (seconds, files, rss kb, open fds) every interval seconds
+    """
+
+    def __init__(self, interval):
+        super(Sampler, self).__init__()
+        self.daemon = True
+        self.interval = interval
+        self.samples = []
+        self.started = time.time()
+        self._done = threading.Event()
+
+    def sample(self):
+        self.samples.append((round(time.time() - self.started, 3),
+                             SyntheticExifTool.calls, rss_kb(), open_fds()))
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.sample()
+
+
+def check_budgets(report, options):
+    """
+    Return a list of the budgets report is over
+    """
+    failures = []
+    if options.min_rate and report['files_per_second'] < options.min_rate:
+        failures.append('{} files/s is under {}'.format(
+            report['files_per_second'], options.min_rate))
+    if options.max_rss and report['peak_rss_kb'] > options.max_rss * 1024:
+        failures.append('peak RSS {}KB is over {}MB'.format(
+            report['peak_rss_kb'], options.max_rss))
+    growth = report['rss_growth_kb']
+    if options.max_rss_growth and growth is not None \
+            and growth > options.max_rss_growth * 1024:
+        failures.append('RSS grew {}KB, more than {}MB'.format(
+            growth, options.max_rss_growth))
+    if options.max_fds and report['peak_fds'] is not None \
+            and report['peak_fds'] > options.max_fds:
+        failures.append('{} open files is over {}'.format(
+            report['peak_fds'], options.max_fds))
+    if options.min_hit_rate and \
+            report['cache_hit_rate'] < options.min_hit_rate:
+        failures.append('recipe cache hit rate {:.1%} is under {:.1%}'.format(
+            report['cache_hit_rate'], options.min_hit_rate))
+    return failures
+
+
+def soak(options):
+    root = options.library or tempfile.mkdtemp(prefix='dpp2xmp-soak-')
+    try:
+        if not os.path.exists(os.path.join(root, '00000')):
+            make_library(root, options.files, seed=options.seed)
+        for sidecar in glob.glob(os.path.join(root, '*', '*.xmp')):
+            os.remove(sidecar)
+        work = tempfile.mkdtemp(prefix='dpp2xmp-soak-state-')
+        main_options = dpp2xmp.parse_args([
+            os.path.join(root, '*', '*.cr2'),
+            '--journal', os.path.join(work, 'journal'),
+            '--quarantine', os.path.join(work, 'quarantine'),
+            '--write-threads', str(options.write_threads),
+        ])
+        SyntheticExifTool.calls = 0
+        sampler = Sampler(options.interval)
+        sampler.sample()
+        sampler.start()
+        started = time.time()
+        stats, cache = dpp2xmp.main(main_options.fileglobs, main_options,
+                                    factory=SyntheticExifTool)
+        seconds = time.time() - started
+        sampler.stop()
+        shutil.rmtree(work)
+    finally:
+        if not options.library and not options.keep:
+            shutil.rmtree(root)
+    samples = sampler.samples
+    # compare against memory once the first tenth of the files is done, so
+    # start-up allocations do not count as growth
+    warm = [s for s in samples if s[1] >= options.files // 10 and s[2]]
+    growth = None
+    if warm and samples[-1][2]:
+        growth = samples[-1][2] - warm[0][2]
+    fds = [s[3] for s in samples if s[3] is not None]
+    processed = stats['files'] + stats['no vrd, skipped']
+    return {
+        'files': options.files,
+        'processed': processed,
+        'exiftool_calls': SyntheticExifTool.calls,
+        'seconds': round(seconds, 3),
+        'files_per_second': round(processed / max(seconds, 0.001), 1),
+        'peak_rss_kb': peak_rss_kb(),
+        'rss_growth_kb': growth,
+        'peak_fds': max(fds) if fds else None,
+        'cache_hit_rate': round(cache.hit_rate, 3),
+        'samples': samples,
+        'note': 'exiftool is stood in for in-process, so peak_fds does not '
+                'include its pipes',
+    }
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description='Soak test dpp2xmp against a synthetic library')
+    parser.add_argument('--files', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--library',
+                        help='generate the library here and keep it for '
+                        'later runs; default is a temporary directory')
+    parser.add_argument('--keep', action='store_true',
+                        help='keep the temporary library')
+    parser.add_argument('--write-threads', type=int, default=4)
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='seconds between samples')
+    parser.add_argument('--report', help='write the report as JSON here')
+    parser.add_argument('--min-rate', type=float,
+                        help='fail under this many files per second')
+    parser.add_argument('--max-rss', type=float,
+                        help='fail if peak RSS is over this many MB')
+    parser.add_argument('--max-rss-growth', type=float,
+                        help='fail if RSS grows by more than this many MB '
+                        'after warming up')
+    parser.add_argument('--max-fds', type=int,
+                        help='fail if more files than this are ever open')
+    parser.add_argument('--min-hit-rate', type=float,
+                        help='fail if fewer than this fraction of '
+                        'conversions come from the recipe cache')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    options = parse_args(sys.argv[1:])
+    report = soak(options)
+    if options.report:
+        with open(options.report, 'w') as f:
+            json.dump(report, f, indent=1)
+    summary = dict((k, v) for k, v in report.items() if k != 'samples')
+    print json.dumps(summary, sort_keys=True)
+    failures = check_budgets(report, options)
+    for failure in failures:
+        print 'Over budget: ' + failure
+    if failures:
+        sys.exit(1)
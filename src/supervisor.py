@@ -0,0 +1,163 @@
+"""
+Keep an exiftool session alive across damaged files.
+
+Each file gets a timeout; a session that hangs or dies is killed and
+restarted, and files that keep failing are quarantined so later runs skip
+them. A checkpoint journal records finished files so a run can resume.
+"""
+
+import collections
+import os
+import sys
+import threading
+
+# how long to wait for a thread stuck on a killed session to notice
+KILL_GRACE = 1.0
+
+
+class Timeout(Exception):
+    pass
+
+
+class Checklist(object):
+    """
+    An append-only list of filenames kept in a text file, one per line.
+    Adding is safe from several threads.
+    """
+
+    def __init__(self, path, keep=True):
+        self.path = path
+        self.names = set()
+        self._lock = threading.Lock()
+        if keep and os.path.exists(path):
+            with open(path) as f:
+                self.names.update(line.rstrip('\n') for line in f if line.strip())
+        self._file = open(path, 'a' if keep else 'w')
+
+    def __contains__(self, filename):
+        return filename in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, filename):
+        with self._lock:
+            if filename in self.names:
+                return
+            self.names.add(filename)
+            self._file.write(filename + '\n')
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class Supervisor(object):
+    """
+    Wraps an exiftool session made by factory, which is expected to behave
+    like exiftool.ExifTool.
+    """
+
+    def __init__(self, factory, timeout=60, attempts=2, quarantine=None,
+                 stats=None):
+        self.factory = factory
+        self.timeout = timeout
+        self.attempts = attempts
+        self.quarantine = quarantine
+        if stats is None:
+            stats = collections.Counter()
+        self.stats = stats
+        self._et = None
+        self._worker = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        self._et = self.factory()
+        self._et.start()
+
+    def stop(self):
+        if self._et is not None:
+            self._et.terminate()
+            self._et = None
+
+    def kill(self):
+        """
+        Stop a session that may be hung, without asking it to exit nicely
+        """
+        process = getattr(self._et, '_process', None)
+        if process is not None:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            # pyexiftool reads until it sees its sentinel, and reads from a
+            # dead process return nothing forever; closing the pipes turns
+            # that into an error, so the stuck thread ends.
+            for pipe in (process.stdin, process.stdout):
+                if pipe is not None:
+                    try:
+                        pipe.close()
+                    except (IOError, OSError):
+                        pass
+        if self._worker is not None:
+            # let it go before a new session can reuse its descriptors
+            self._worker.join(KILL_GRACE)
+            if self._worker.is_alive():
+                self.stats['stuck exiftool threads'] += 1
+            self._worker = None
+        self._et = None
+
+    def restart(self):
+        self.kill()
+        self.start()
+        self.stats['exiftool restarts'] += 1
+
+    def _call(self, filename):
+        result = {}
+        et = self._et
+
+        def work():
+            try:
+                result['metadata'] = et.get_metadata(filename)
+            except Exception as e:
+                result['error'] = e
+
+        thread = threading.Thread(target=work)
+        thread.daemon = True
+        thread.start()
+        thread.join(self.timeout)
+        if thread.is_alive():
+            self._worker = thread
+            self.stats['exiftool timeouts'] += 1
+            raise Timeout('{} took more than {}s'.format(filename, self.timeout))
+        if 'error' in result:
+            raise result['error']
+        return result['metadata']
+
+    def get_metadata(self, filename):
+        """
+        Return the metadata for filename, or None if it is (or has just been)
+        quarantined.
+        """
+        if self.quarantine is not None and filename in self.quarantine:
+            self.stats['quarantined'] += 1
+            return None
+        for attempt in range(self.attempts):
+            try:
+                metadata = self._call(filename)
+            except Exception as e:
+                print >> sys.stderr, 'exiftool failed on {} (attempt {}): {!r}'.format(
+                    filename, attempt + 1, e)
+                self.stats['exiftool failures'] += 1
+                self.restart()
+                continue
+            return metadata
+        if self.quarantine is not None:
+            self.quarantine.add(filename)
+        self.stats['quarantined'] += 1
+        return None
@@ -0,0 +1,85 @@
+"""
+Tests for archive
+"""
+import os
+import shutil
+import StringIO
+import tempfile
+
+import archive
+import writer
+
+
+def assertEqual(actual, expected):
+    assert expected == actual, 'Expected %r, got %r' % (expected, actual)
+
+def pack(directory, sidecars, format, manifest=None):
+    out = StringIO.StringIO()
+    done = []
+    with archive.ArchiveWriter(out, format, root=directory, manifest=manifest) as packer:
+        for relative, content in sidecars:
+            packer.write(os.path.join(directory, relative), content, lambda r=relative: done.append(r))
+    assertEqual(done, [relative for relative, content in sidecars])
+    return out.getvalue(), packer.stats
+
+def test_round_trip():
+    source = tempfile.mkdtemp()
+    destination = tempfile.mkdtemp()
+    try:
+        sidecars = [('2014/a.xmp', '<a/>'), ('2014/b.xmp', '<b/>'), ('c.xmp', '<c/>')]
+        for format in archive.FORMATS:
+            packed, stats = pack(source, sidecars, format)
+            assertEqual(stats['archived'], 3)
+            w = writer.Writer(threads=0)
+            archive.unpack(StringIO.StringIO(packed), w, format, destination)
+            w.close()
+            for relative, content in sidecars:
+                assertEqual(open(os.path.join(destination, relative)).read(), content)
+        # the second format found everything already in place
+        assertEqual(w.stats['unchanged'], 3)
+    finally:
+        shutil.rmtree(source)
+        shutil.rmtree(destination)
+
+def test_manifest_skips_unchanged():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'manifest')
+        pack(directory, [('a.xmp', '<a/>'), ('b.xmp', '<b/>')], 'jsonl', archive.Manifest(path))
+        packed, stats = pack(directory, [('a.xmp', '<a/>'), ('b.xmp', '<b2/>')], 'jsonl', archive.Manifest(path))
+        assertEqual(stats['unchanged'], 1)
+        assertEqual(stats['archived'], 1)
+        assert '"b.xmp"' in packed
+        assert '"a.xmp"' not in packed
+    finally:
+        shutil.rmtree(directory)
+
+def test_fresh_manifest_resends_everything():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'manifest')
+        pack(directory, [('a.xmp', '<a/>'), ('b.xmp', '<b/>')], 'jsonl', archive.Manifest(path))
+        packed, stats = pack(directory, [('a.xmp', '<a/>'), ('b.xmp', '<b/>')], 'jsonl', archive.Manifest(path, fresh=True))
+        assertEqual(stats['archived'], 2)
+        assertEqual(sorted(archive.Manifest(path).hashes), ['a.xmp', 'b.xmp'])
+    finally:
+        shutil.rmtree(directory)
+
+def test_outside_root():
+    directory = tempfile.mkdtemp()
+    try:
+        packed, stats = pack(directory, [], 'jsonl')
+        packer = archive.ArchiveWriter(StringIO.StringIO(), 'jsonl', root=directory)
+        packer.write('/somewhere/else.xmp', '<a/>')
+        assertEqual(packer.stats['archive errors'], 1)
+    finally:
+        shutil.rmtree(directory)
+
+def test_safe_path():
+    assertEqual(archive.safe_path('/library', '2014/a.xmp'), '/library/2014/a.xmp')
+    for relative in ['/etc/passwd', '../a.xmp', '2014/../../a.xmp']:
+        try:
+            archive.safe_path('/library', relative)
+        except ValueError:
+            continue
+        assert False, 'Expected ValueError for %r' % relative
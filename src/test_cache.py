@@ -0,0 +1,28 @@
+"""
+Tests for cache
+"""
+import cache
+
+
+def assertEqual(actual, expected):
+    assert expected == actual, 'Expected %r, got %r' % (expected, actual)
+
+def test_LRUCache_hits_and_misses():
+    lru = cache.LRUCache(2)
+    assertEqual(lru.get('a'), None)
+    lru.put('a', 1)
+    assertEqual(lru.get('a'), 1)
+    assertEqual(lru.hits, 1)
+    assertEqual(lru.misses, 1)
+    assertEqual(lru.hit_rate, 0.5)
+
+def test_LRUCache_evicts_least_recent():
+    lru = cache.LRUCache(2)
+    lru.put('a', 1)
+    lru.put('b', 2)
+    lru.get('a')
+    lru.put('c', 3)
+    assert 'a' in lru
+    assert 'b' not in lru
+    assert 'c' in lru
+    assertEqual(len(lru), 2)
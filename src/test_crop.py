@@ -0,0 +1,89 @@
+"""
+Tests for crop
+"""
+import crop
+
+
+def assertEqual(actual, expected):
+    assert expected == actual, 'Expected %r, got %r' % (expected, actual)
+
+def assertAlmostEqual(actual, expected):
+    assert abs(expected - actual) < 0.0001, 'Expected %r, got %r' % (expected, actual)
+
+def rounded(xmp_crop):
+    return tuple(round(value, 4) for value in xmp_crop)
+
+def test_orientation_code():
+    assertEqual(crop.orientation_code(6), 6)
+    assertEqual(crop.orientation_code('Rotate 90 CW'), 6)
+    assertEqual(crop.orientation_code('Something else'), 1)
+
+def test_crop_horizontal():
+    engine = crop.CropEngine()
+    result = engine.crop(100, 200, 1, 10, 20, 50, 100, 0)
+    assertEqual(rounded(result), (0.1, 0.1, 0.6, 0.6, 0))
+
+def test_crop_clamps():
+    engine = crop.CropEngine()
+    result = engine.crop(100, 100, 1, -10, -10, 200, 200, 0)
+    assertEqual(result.top, 0)
+    assertEqual(result.left, 0)
+    assertEqual(result.bottom, 1)
+    assertEqual(result.right, 1)
+    assertEqual(result.angle, 0)
+
+def test_crop_angled():
+    engine = crop.CropEngine()
+    result = engine.crop(1000, 1000, 1, 250, 250, 500, 500, 10)
+    # the upper left corner of a square rotated around its center
+    assertAlmostEqual(result.left, 0.5 - 0.25 * (0.98481 - 0.17365))
+    assertAlmostEqual(result.top, 0.5 - 0.25 * (0.98481 + 0.17365))
+
+def test_crop_rotated_portrait():
+    engine = crop.CropEngine()
+    # stored 200 wide by 100 high, displayed 100 wide by 200 high
+    result = engine.crop(100, 200, 'Rotate 90 CW', 0, 0, 100, 50, 0)
+    # the top half of the displayed image is the left half of the stored one
+    assertEqual(rounded(result), (0.5, 0, 1, 0.5, 0))
+
+def test_crop_rotate_180():
+    engine = crop.CropEngine()
+    result = engine.crop(100, 200, 3, 0, 0, 50, 100, 0)
+    assertEqual(rounded(result), (0.5, 0.5, 1, 1, 0))
+
+def test_crop_mirrored_angle():
+    engine = crop.CropEngine()
+    assertEqual(engine.crop(100, 100, 2, 0, 0, 10, 10, 5).angle, 5)
+
+def test_rotation_cached_per_step():
+    engine = crop.CropEngine()
+    assert engine.rotation(1.001) is engine.rotation(1.0)
+    assert engine.rotation(1.01) is not engine.rotation(1.0)
+
+def test_crop_angled_orientations():
+    engine = crop.CropEngine()
+    expected = rounded(engine.crop(1000, 1000, 1, 250, 250, 500, 500, 10))
+    # turning a centred square by a quarter turn gives the same square
+    for orientation in (6, 8):
+        result = engine.crop(1000, 1000, orientation, 250, 250, 500, 500, 10)
+        assertEqual(rounded(result), expected)
+    # mirroring it gives the same square, angled the other way
+    result = engine.crop(1000, 1000, 2, 250, 250, 500, 500, 10)
+    mirrored = rounded(engine.crop(1000, 1000, 1, 250, 250, 500, 500, -10))
+    assertEqual(rounded(result), mirrored)
+
+def test_crop_angled_rotated_portrait():
+    engine = crop.CropEngine()
+    # stored 2000 wide by 1000 high, displayed 1000 wide by 2000 high. The
+    # displayed box centred on (500, 750) is the stored box centred on
+    # (750, 500), with width and height swapped.
+    result = engine.crop(1000, 2000, 6, 250, 250, 1000, 500, 10)
+    stored = engine.crop(1000, 2000, 1, 250, 250, 500, 1000, 10)
+    assertEqual(rounded(result), rounded(stored))
+
+def test_crop_angled_rotate_270():
+    engine = crop.CropEngine()
+    # the top of the displayed image is the right of the stored one
+    result = engine.crop(1000, 2000, 8, 250, 250, 1000, 500, 10)
+    stored = engine.crop(1000, 2000, 1, 250, 750, 500, 1000, 10)
+    assertEqual(rounded(result), rounded(stored))
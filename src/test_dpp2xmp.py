@@ -0,0 +1,231 @@
+"""
+Tests for dpp2xmp
+"""
+import collections
+import json
+import os
+import shutil
+import StringIO
+import tempfile
+
+import cache
+import dpp2xmp
+import tracing
+
+
+def assertEqual(actual, expected):
+    assert expected == actual, 'Expected %r, got %r' % (expected, actual)
+
+def make_metadata(**kw):
+    metadata = {
+        'EXIF:ExifImageHeight': 3456,
+        'EXIF:ExifImageWidth': 5184,
+        'CanonVRD:PictureStyle': 2,
+        'CanonVRD:LandscapeRawContrast': 3,
+        'CanonVRD:WhiteBalanceAdj': 'Daylight',
+    }
+    metadata.update(kw)
+    return metadata
+
+def test_process_metadata():
+    metadata = dpp2xmp.process_metadata(make_metadata())
+    assertEqual(metadata['crs:WhiteBalance'], 'Daylight')
+    assertEqual(metadata['crs:Contrast2012'], 3)
+    assertEqual(metadata['crs:HasCrop'], False)
+    assertEqual(metadata['crs:ImageHeight'], 3456)
+
+def test_process_metadata_crop():
+    metadata = dpp2xmp.process_metadata(make_metadata(**{
+        'CanonVRD:CropActive': 'Yes',
+        'CanonVRD:CropTop': 0,
+        'CanonVRD:CropLeft': 0,
+        'CanonVRD:CropHeight': 1728,
+        'CanonVRD:CropWidth': 2592,
+    }))
+    assertEqual(metadata['crs:HasCrop'], True)
+    assertEqual(metadata['crs:CropTop'], 0)
+    assertEqual(metadata['crs:CropLeft'], 0)
+    assertEqual(metadata['crs:CropBottom'], 0.5)
+    assertEqual(metadata['crs:CropRight'], 0.5)
+
+def test_process_metadata_shares_cached_recipe():
+    lru = cache.LRUCache()
+    first = dpp2xmp.process_metadata(make_metadata(**{'EXIF:FNumber': 4}), lru)
+    second = dpp2xmp.process_metadata(make_metadata(**{'EXIF:FNumber': 8}), lru)
+    assertEqual(lru.hits, 1)
+    assertEqual(lru.misses, 1)
+    assertEqual(first['crs:Contrast2012'], second['crs:Contrast2012'])
+    assertEqual(second['EXIF:FNumber'], 8)
+
+def test_process_metadata_different_recipe_misses():
+    lru = cache.LRUCache()
+    dpp2xmp.process_metadata(make_metadata(), lru)
+    dpp2xmp.process_metadata(make_metadata(**{'CanonVRD:WhiteBalanceAdj': 'Shade'}), lru)
+    assertEqual(lru.hits, 0)
+    assertEqual(lru.misses, 2)
+
+def test_process_metadata_overridden_sources_share_cache():
+    lru = cache.LRUCache()
+    results = [dpp2xmp.process_metadata(make_metadata(**{
+        'CanonVRD:WBAdjColorTemp': 5000,
+        'MakerNotes:ColorTemperature': temperature,
+        'EXIF:WhiteBalance': 0,
+    }), lru) for temperature in (4100, 4200, 4300)]
+    assertEqual(lru.hits, 2)
+    assertEqual(lru.misses, 1)
+    assertEqual(set(r['crs:Temperature'] for r in results), set([5000]))
+
+def test_process_record_traces_cache_lookups():
+    out = StringIO.StringIO()
+    tracer = tracing.Tracer(out)
+    lru = cache.LRUCache()
+    for name in ('a.cr2', 'b.cr2'):
+        dpp2xmp.process_record(dpp2xmp.extract_record(make_metadata()), lru, tracer.file(name))
+    events = json.loads(out.getvalue() + ']}')['traceEvents']
+    assertEqual([(e['name'], e['args']) for e in events], [
+        ('cache', {'file': 'a.cr2', 'hit': False}),
+        ('cache', {'file': 'b.cr2', 'hit': True}),
+    ])
+
+def test_process_record_unhashable_values():
+    lru = cache.LRUCache()
+    record = dpp2xmp.extract_record(make_metadata(**{'MakerNotes:Sharpness': [1, 2]}))
+    assertEqual(dpp2xmp.process_record(record, lru).crs['crs:Sharpness'], [1, 2])
+    assertEqual(len(lru), 0)
+
+def test_record_to_fields():
+    r = dpp2xmp.process_record(dpp2xmp.extract_record(make_metadata(**{'XMP:Rating': 3, 'MakerNotes:SerialNumber': '1234'})))
+    fields = dpp2xmp.record_to_fields(r).split('\r\n   ')
+    assert 'xmp:Rating="3"' in fields
+    assert 'crs:WhiteBalance="Daylight"' in fields
+    assert 'crs:Contrast2012="3"' in fields
+    assert 'crs:Vibrance="0"' in fields
+    assert not [field for field in fields if field.startswith('MakerNotes')]
+    assertEqual(fields, sorted(fields))
+
+def test_record_to_fields_non_ascii():
+    r = dpp2xmp.process_record(dpp2xmp.extract_record(make_metadata(**{'EXIF:Artist': u'Jos\xe9'})))
+    fields = dpp2xmp.record_to_fields(r).split('\r\n   ')
+    assert 'exif:Artist="Jos\xc3\xa9"' in fields
+    attributes = dict(dpp2xmp.record_to_attributes(r))
+    assertEqual(attributes['exif:Artist'].decode('utf-8'), u'Jos\xe9')
+
+def test_process_metadata_unknown_white_balance():
+    metadata = dpp2xmp.process_metadata(make_metadata(**{
+        'CanonVRD:WhiteBalanceAdj': 'Something new',
+        'CanonVRD:WBAdjColorTemp': 4000,
+    }))
+    assertEqual(metadata['crs:WhiteBalance'], 'As Shot')
+    assertEqual(metadata['crs:Temperature'], 4000)
+
+def test_process_record_counts_unknown_white_balance():
+    lru = cache.LRUCache()
+    stats = collections.Counter()
+    for i in range(3):
+        record = dpp2xmp.extract_record(make_metadata(**{'CanonVRD:WhiteBalanceAdj': 'Something new'}))
+        dpp2xmp.process_record(record, lru, stats=stats)
+    assertEqual(lru.hits, 2)
+    assertEqual(stats, {"unknown CanonVRD:WhiteBalanceAdj 'Something new'": 3})
+
+def test_process_metadata_fluorescent_spelling():
+    for value in (4, 'Fluorescent'):
+        metadata = dpp2xmp.process_metadata(make_metadata(**{'CanonVRD:WhiteBalanceAdj': value}))
+        assertEqual(metadata['crs:WhiteBalance'], 'Fluorescent')
+    for value in (4, 14, 'Fluorescent', 'Daylight Fluorescent'):
+        metadata = make_metadata(**{'MakerNotes:WhiteBalance': value})
+        del metadata['CanonVRD:WhiteBalanceAdj']
+        assertEqual(dpp2xmp.process_metadata(metadata)['crs:WhiteBalance'], 'Fluorescent')
+
+def test_process_metadata_camera_white_balance():
+    def white_balance(**kw):
+        metadata = make_metadata(**kw)
+        del metadata['CanonVRD:WhiteBalanceAdj']
+        return dpp2xmp.process_metadata(metadata)['crs:WhiteBalance']
+    # EXIF 1 is Manual, not Daylight
+    assertEqual(white_balance(**{'EXIF:WhiteBalance': 1}), 'As Shot')
+    assertEqual(white_balance(**{'MakerNotes:WhiteBalance': 6}), 'Custom')
+    assertEqual(white_balance(**{'MakerNotes:WhiteBalance': 8}), 'Shade')
+    # the DPP setting wins over the camera's
+    metadata = dpp2xmp.process_metadata(make_metadata(**{'EXIF:WhiteBalance': 0, 'MakerNotes:WhiteBalance': 8}))
+    assertEqual(metadata['crs:WhiteBalance'], 'Daylight')
+
+def test_record_to_crs_attributes():
+    r = dpp2xmp.process_record(dpp2xmp.extract_record(make_metadata(**{'XMP:Rating': 3})))
+    attributes = dict(dpp2xmp.record_to_crs_attributes(r))
+    assertEqual(attributes['crs:WhiteBalance'], 'Daylight')
+    assert 'crs:Vibrance' not in attributes
+    assert 'xmp:Rating' not in attributes
+    assertEqual(set(attributes), set(r.crs))
+
+class NoDimensionsExifTool(object):
+    """
+    Reports no image dimensions for files containing 'damaged'
+    """
+
+    def start(self):
+        pass
+
+    def terminate(self):
+        pass
+
+    def get_metadata(self, filename):
+        metadata = make_metadata(SourceFile=filename)
+        if 'damaged' in filename:
+            del metadata['EXIF:ExifImageHeight']
+        return metadata
+
+def test_main_skips_files_without_dimensions():
+    directory = tempfile.mkdtemp()
+    try:
+        for name in ('damaged.cr2', 'good.cr2'):
+            open(os.path.join(directory, name), 'w').close()
+        options = dpp2xmp.parse_args([
+            os.path.join(directory, '*.cr2'), '--no-vrd', 'convert',
+            '--journal', os.path.join(directory, 'journal'),
+            '--quarantine', os.path.join(directory, 'quarantine')])
+        dpp2xmp.main(options.fileglobs, options, NoDimensionsExifTool)
+        assert os.path.exists(os.path.join(directory, 'good.xmp'))
+        assert not os.path.exists(os.path.join(directory, 'damaged.xmp'))
+        assertEqual(open(os.path.join(directory, 'quarantine')).read(),
+                    os.path.join(directory, 'damaged.cr2') + '\n')
+    finally:
+        shutil.rmtree(directory)
+
+class CountingExifTool(NoDimensionsExifTool):
+    """
+    Records every file it is asked to extract
+    """
+    extracted = []
+
+    def get_metadata(self, filename):
+        self.extracted.append(filename)
+        return NoDimensionsExifTool.get_metadata(self, filename)
+
+def test_main_skips_extraction_for_up_to_date_sidecars():
+    directory = tempfile.mkdtemp()
+    try:
+        raw = os.path.join(directory, 'good.cr2')
+        xmp = os.path.join(directory, 'good.xmp')
+        open(raw, 'w').close()
+        open(xmp, 'w').close()
+        os.utime(raw, (1000, 1000))
+        options = dpp2xmp.parse_args([
+            os.path.join(directory, '*.cr2'), '--no-vrd', 'convert',
+            '--journal', os.path.join(directory, 'journal'),
+            '--quarantine', os.path.join(directory, 'quarantine')])
+        CountingExifTool.extracted = []
+        stats, _ = dpp2xmp.main(options.fileglobs, options, CountingExifTool)
+        assertEqual(CountingExifTool.extracted, [])
+        assertEqual(stats['up to date'], 1)
+        assertEqual(open(os.path.join(directory, 'journal')).read(),
+                    raw + '\n')
+    finally:
+        shutil.rmtree(directory)
+
+def test_parse_args_rejects_merge_with_archive():
+    try:
+        dpp2xmp.parse_args(['*.cr2', '--merge', '--archive', '-'])
+    except SystemExit:
+        pass
+    else:
+        assert False, '--merge with --archive was accepted'
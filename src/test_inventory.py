@@ -0,0 +1,72 @@
+"""
+Tests for inventory
+"""
+import json
+import StringIO
+
+import inventory
+import record
+
+
+def assertEqual(actual, expected):
+    assert expected == actual, 'Expected %r, got %r' % (expected, actual)
+
+def make_record():
+    recipe = (
+        ('CanonVRD:AngleAdj', 1.5),
+        ('CanonVRD:CropActive', 'Yes'),
+        ('CanonVRD:WhiteBalanceAdj', 'Daylight'),
+    )
+    crs = {'crs:HasCrop': True, 'crs:CropAngle': -1.5, 'crs:WhiteBalance': 'Daylight'}
+    return record.Record('a.cr2', recipe, 1, (), crs)
+
+def test_find_edits():
+    assertEqual(inventory.find_edits({}, {}), [])
+    assertEqual(inventory.find_edits({'CanonVRD:WhiteBalanceAdj': 'Auto'}, {'crs:WhiteBalance': 'As Shot'}), [])
+    assertEqual(inventory.find_edits({'CanonVRD:AngleAdj': 0, 'CanonVRD:PictureStyle': 2}, {}), [])
+
+def test_find_edits_picture_style():
+    def edits(vrd, camera):
+        return inventory.find_edits({'CanonVRD:PictureStyle': vrd, 'MakerNotes:PictureStyle': camera}, {})
+    assertEqual(edits(2, 0x83), [])
+    assertEqual(edits('Landscape', 'Landscape'), [])
+    assertEqual(edits(7, 'User Def. 2'), [])
+    assertEqual(edits(2, 0x81), ['picture style'])
+    assertEqual(edits(5, 'Standard'), ['picture style'])
+
+def test_InventoryWriter_jsonl():
+    out = StringIO.StringIO()
+    writer = inventory.InventoryWriter(out)
+    writer.write('a.cr2', make_record())
+    writer.write('b.cr2', record.Record('b.cr2', (), 1, (), {}))
+    lines = out.getvalue().splitlines()
+    assertEqual(len(lines), 2)
+    row = json.loads(lines[0])
+    assertEqual(row['file'], 'a.cr2')
+    assertEqual(row['status'], 'ok')
+    assertEqual(row['edits'], 'crop angle white balance')
+    assertEqual(row['CanonVRD:AngleAdj'], 1.5)
+    assertEqual(row['crs:CropAngle'], -1.5)
+    assertEqual(row['crs:Temperature'], None)
+    assertEqual(json.loads(lines[1])['edits'], '')
+
+def test_InventoryWriter_csv():
+    out = StringIO.StringIO()
+    writer = inventory.InventoryWriter(out, 'csv')
+    writer.write('a.cr2', make_record())
+    lines = out.getvalue().splitlines()
+    assertEqual(lines[0].split(','), list(inventory.COLUMNS))
+    assert lines[1].startswith('a.cr2,ok,crop angle white balance,Yes,')
+
+def test_InventoryWriter_status():
+    out = StringIO.StringIO()
+    writer = inventory.InventoryWriter(out)
+    writer.write('a.cr2', None, 'exiftool failed')
+    no_dimensions = make_record()
+    no_dimensions.crs = None
+    writer.write('b.cr2', no_dimensions, 'no dimensions')
+    rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    assertEqual(rows[0]['status'], 'exiftool failed')
+    assertEqual(rows[0]['edits'], '')
+    assertEqual(rows[1]['status'], 'no dimensions')
+    assertEqual(rows[1]['CanonVRD:CropActive'], 'Yes')
@@ -0,0 +1,103 @@
+"""
+Tests for merge
+"""
+import StringIO
+
+import merge
+
+
+def assertEqual(actual, expected):
+    assert expected == actual, 'Expected %r, got %r' % (expected, actual)
+
+SIDECAR = '''<x:xmpmeta xmlns:x="adobe:ns:meta/">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about=""
+    xmlns:xmp="http://ns.adobe.com/xap/1.0/"
+    xmlns:dc="http://purl.org/dc/elements/1.1/"
+    xmlns:crs="http://ns.adobe.com/camera-raw-settings/1.0/"
+    xmp:Rating="4"
+    xmp:Label="Red &amp; &quot;blue&quot; &gt;"
+    crs:CropTop="0.5">
+   <crs:WhiteBalance>Shade</crs:WhiteBalance>
+   <dc:subject>
+    <rdf:Bag>
+     <rdf:li>holiday</rdf:li>
+    </rdf:Bag>
+   </dc:subject>
+   <crs:HasCrop/>
+  </rdf:Description>
+ </rdf:RDF>
+</x:xmpmeta>
+'''
+
+def merged(sidecar, attributes, chunk_size=None):
+    out = StringIO.StringIO()
+    merger = merge.Merger(attributes, out)
+    chunk_size = chunk_size or len(sidecar)
+    for i in range(0, len(sidecar), chunk_size):
+        merger.feed(sidecar[i:i + chunk_size])
+    merger.close()
+    return out.getvalue()
+
+def test_tag_end():
+    assertEqual(merge.tag_end('<a b=">">c', 0), 9)
+    assertEqual(merge.tag_end("<a b='>'/>", 0), 10)
+
+def test_Merger():
+    attributes = [('crs:CropTop', '0.25'), ('crs:HasCrop', 'True'), ('crs:WhiteBalance', 'Daylight'), ('tiff:Make', 'Canon')]
+    result = merged(SIDECAR, attributes)
+    assert 'xmp:Rating="4"' in result
+    assert 'xmp:Label="Red &amp; &quot;blue&quot; &gt;"' in result
+    assert '<rdf:li>holiday</rdf:li>' in result
+    assert 'crs:CropTop="0.25"' in result
+    assert 'crs:CropTop="0.5"' not in result
+    assert 'crs:WhiteBalance="Daylight"' in result
+    assert '<crs:WhiteBalance>' not in result
+    assert '<crs:HasCrop/>' not in result
+    assert 'xmlns:tiff="http://ns.adobe.com/tiff/1.0/"' in result
+    assertEqual(result.count('xmlns:crs='), 1)
+    assert result.startswith('<x:xmpmeta xmlns:x="adobe:ns:meta/">\n <rdf:RDF')
+    assert result.endswith('  </rdf:Description>\n </rdf:RDF>\n</x:xmpmeta>\n')
+
+def test_Merger_chunks():
+    attributes = [('crs:CropTop', '0.25'), ('crs:WhiteBalance', 'Daylight')]
+    whole = merged(SIDECAR, attributes)
+    for chunk_size in [1, 7, 64]:
+        assertEqual(merged(SIDECAR, attributes, chunk_size), whole)
+
+def test_Merger_every_description():
+    sidecar = '''<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+ <rdf:Description rdf:about="" xmlns:xmp="http://ns.adobe.com/xap/1.0/" xmp:Rating="2"/>
+ <rdf:Description rdf:about="" xmlns:crs="http://ns.adobe.com/camera-raw-settings/1.0/"
+   crs:CropTop="0.5" crs:Vibrance="+10">
+  <crs:WhiteBalance>Shade</crs:WhiteBalance>
+ </rdf:Description>
+</rdf:RDF>'''
+    result = merged(sidecar, [('crs:CropTop', '0.25'), ('crs:WhiteBalance', 'Daylight')])
+    assertEqual(result.count('crs:CropTop='), 1)
+    assert 'crs:CropTop="0.25"' in result
+    assert '<crs:WhiteBalance>' not in result
+    assert 'crs:Vibrance="+10"' in result
+    assert 'xmp:Rating="2"' in result
+    assert '<rdf:Description rdf:about="" xmlns:crs="http://ns.adobe.com/camera-raw-settings/1.0/" crs:Vibrance="+10">' in result
+
+def test_Merger_keeps_character_references():
+    sidecar = '''<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+ <rdf:Description rdf:about="" xmlns:dc="http://purl.org/dc/elements/1.1/" dc:title='a&#xA;b&#9;c' crs:CropTop="0.5"/>
+</rdf:RDF>'''
+    result = merged(sidecar, [('crs:CropTop', '0.25')])
+    assert "dc:title='a&#xA;b&#9;c'" in result
+    assert 'crs:CropTop="0.5"' not in result
+
+def test_Merger_self_closing_description():
+    sidecar = '<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"><rdf:Description rdf:about=""/></rdf:RDF>'
+    result = merged(sidecar, [('crs:HasCrop', 'False')])
+    assert result.endswith('crs:HasCrop="False"/></rdf:RDF>')
+
+def test_Merger_errors():
+    for sidecar in ['<a><b></a>', '<a/>']:
+        try:
+            merged(sidecar, [])
+        except merge.MergeError:
+            continue
+        assert False, 'Expected MergeError for %r' % sidecar
@@ -0,0 +1,40 @@
+"""
+Tests for record
+"""
+import record
+
+
+def assertEqual(actual, expected):
+    assert expected == actual, 'Expected %r, got %r' % (expected, actual)
+
+def test_passthrough_key():
+    assertEqual(record.passthrough_key('EXIF:FNumber'), 'exif:FNumber')
+    assertEqual(record.passthrough_key('xmpMM:DocumentID'), 'xmpMM:DocumentID')
+    assertEqual(record.passthrough_key('crs:CropTop'), 'crs:CropTop')
+    assertEqual(record.passthrough_key('MakerNotes:Contrast'), None)
+    assertEqual(record.passthrough_key('SourceFile'), None)
+
+def test_Record_from_metadata():
+    metadata = {
+        'SourceFile': 'a.cr2',
+        'EXIF:FNumber': 4,
+        'EXIF:Orientation': 'Rotate 90 CW',
+        'XMP:Rating': 3,
+        'CanonVRD:CropActive': 'Yes',
+        'MakerNotes:Contrast': 1,
+        'MakerNotes:SerialNumber': '1234',
+    }
+    r = record.Record.from_metadata(metadata, frozenset(['MakerNotes:Contrast']), ('tiff:Orientation', 'EXIF:Orientation'))
+    assertEqual(r.filename, 'a.cr2')
+    assertEqual(r.recipe, (('CanonVRD:CropActive', 'Yes'), ('MakerNotes:Contrast', 1)))
+    assertEqual(r.passthrough, (('exif:FNumber', 4), ('exif:Orientation', 'Rotate 90 CW'), ('xmp:Rating', 3)))
+    assertEqual(r.orientation, 'Rotate 90 CW')
+    assertEqual(r.crs, None)
+
+def test_Record_slots():
+    r = record.Record('a.cr2', (), 1, ())
+    try:
+        r.extra = 1
+    except AttributeError:
+        return
+    assert False, 'Expected AttributeError'
@@ -0,0 +1,84 @@
+"""
+Tests for scheduler
+"""
+import os
+import shutil
+import tempfile
+
+import scheduler
+
+
+def assertEqual(actual, expected):
+    assert expected == actual, 'Expected %r, got %r' % (expected, actual)
+
+def make_files(directory, names_and_mtimes):
+    paths = []
+    for name, mtime in names_and_mtimes:
+        path = os.path.join(directory, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        open(path, 'w').close()
+        os.utime(path, (mtime, mtime))
+        paths.append(path)
+    return paths
+
+def test_Scheduler_glob():
+    s = scheduler.Scheduler()
+    for name in ['b.cr2', 'a.cr2', 'c.cr2']:
+        s.add(name)
+    assertEqual(list(s), ['b.cr2', 'a.cr2', 'c.cr2'])
+
+def test_Scheduler_mtime():
+    directory = tempfile.mkdtemp()
+    try:
+        old, new, middle = make_files(directory, [('old.cr2', 1000), ('new.cr2', 3000), ('middle.cr2', 2000)])
+        s = scheduler.Scheduler('mtime')
+        for path in [old, new, middle]:
+            s.add(path)
+        assertEqual(list(s), [new, middle, old])
+    finally:
+        shutil.rmtree(directory)
+
+def test_Scheduler_directory():
+    directory = tempfile.mkdtemp()
+    try:
+        archive, today = make_files(directory, [('2010/a.cr2', 5000), ('2014/b.cr2', 1000)])
+        os.utime(os.path.dirname(archive), (1000, 1000))
+        os.utime(os.path.dirname(today), (2000, 2000))
+        s = scheduler.Scheduler('directory')
+        s.add(archive)
+        s.add(today)
+        assertEqual(list(s), [today, archive])
+    finally:
+        shutil.rmtree(directory)
+
+def test_Scheduler_paths():
+    directory = tempfile.mkdtemp()
+    try:
+        a, b, c = make_files(directory, [('x/a.cr2', 3000), ('y/b.cr2', 1000), ('y/c.cr2', 2000)])
+        s = scheduler.Scheduler('paths', paths=[os.path.join(directory, 'y')])
+        for path in [a, b, c]:
+            s.add(path)
+        assertEqual(list(s), [c, b, a])
+    finally:
+        shutil.rmtree(directory)
+
+def test_Scheduler_max_seconds():
+    now = [0]
+    s = scheduler.Scheduler(max_seconds=10, clock=lambda: now[0])
+    for name in ['a.cr2', 'b.cr2', 'c.cr2']:
+        s.add(name)
+    taken = []
+    for name in s:
+        taken.append(name)
+        now[0] += 6
+    assertEqual(taken, ['a.cr2', 'b.cr2'])
+    assert s.expired
+    assertEqual(len(s), 1)
+
+def test_Scheduler_bad_priority():
+    try:
+        scheduler.Scheduler('alphabetical')
+    except ValueError:
+        return
+    assert False, 'Expected ValueError'
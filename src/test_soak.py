@@ -0,0 +1,38 @@
+"""
+Tests for soak, running main() end to end on a small synthetic library
+"""
+import glob
+import os
+import shutil
+import tempfile
+
+import soak
+
+
+def assertEqual(actual, expected):
+    assert expected == actual, 'Expected %r, got %r' % (expected, actual)
+
+def test_soak():
+    library = tempfile.mkdtemp()
+    try:
+        options = soak.parse_args(['--files', '300', '--library', library, '--interval', '0.05', '--min-hit-rate', '0.5'])
+        report = soak.soak(options)
+        sidecars = glob.glob(os.path.join(library, '*', '*.xmp'))
+        assertEqual(len(sidecars), report['exiftool_calls'])
+        assert 0 < report['exiftool_calls'] < 300
+        assertEqual(report['processed'], 300)
+        assert report['files_per_second'] > 0
+        assert report['samples']
+        assert report['cache_hit_rate'] >= 0.5
+        assertEqual(soak.check_budgets(report, options), [])
+        # running again regenerates the same sidecars
+        assertEqual(soak.soak(options)['exiftool_calls'], report['exiftool_calls'])
+    finally:
+        shutil.rmtree(library)
+
+def test_check_budgets():
+    options = soak.parse_args(['--min-rate', '100', '--max-rss', '1', '--max-rss-growth', '1', '--max-fds', '10', '--min-hit-rate', '0.5'])
+    report = {'files_per_second': 50, 'peak_rss_kb': 2048, 'rss_growth_kb': 2048, 'peak_fds': 11, 'cache_hit_rate': 0.25}
+    assertEqual(len(soak.check_budgets(report, options)), 5)
+    report = {'files_per_second': 150, 'peak_rss_kb': 512, 'rss_growth_kb': None, 'peak_fds': None, 'cache_hit_rate': 0.75}
+    assertEqual(soak.check_budgets(report, options), [])
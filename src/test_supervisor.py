@@ -0,0 +1,107 @@
+"""
+Tests for supervisor
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import supervisor
+
+
+def assertEqual(actual, expected):
+    assert expected == actual, 'Expected %r, got %r' % (expected, actual)
+
+class FakeExifTool(object):
+    """
+    Hangs on files containing 'hang' and fails on files containing 'bad'
+    """
+    started = 0
+
+    def start(self):
+        FakeExifTool.started += 1
+
+    def terminate(self):
+        pass
+
+    def get_metadata(self, filename):
+        if 'hang' in filename:
+            time.sleep(1)
+        if 'bad' in filename:
+            raise ValueError(filename)
+        return {'SourceFile': filename}
+
+class PipeExifTool(object):
+    """
+    Reads its process's output until a sentinel the way pyexiftool does,
+    from a process that never answers
+    """
+
+    def start(self):
+        self._process = subprocess.Popen(
+            ['sleep', '60'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def terminate(self):
+        self._process.kill()
+        self._process.wait()
+
+    def get_metadata(self, filename):
+        output = ''
+        fd = self._process.stdout.fileno()
+        while not output.endswith('{ready}'):
+            output += os.read(fd, 4096)
+
+def test_Checklist():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'journal')
+        checklist = supervisor.Checklist(path)
+        checklist.add('a.cr2')
+        checklist.add('a.cr2')
+        checklist.close()
+        assertEqual(open(path).read(), 'a.cr2\n')
+        resumed = supervisor.Checklist(path, keep=True)
+        assert 'a.cr2' in resumed
+        resumed.close()
+        fresh = supervisor.Checklist(path, keep=False)
+        assert 'a.cr2' not in fresh
+        fresh.close()
+    finally:
+        shutil.rmtree(directory)
+
+def test_Supervisor_get_metadata():
+    with supervisor.Supervisor(FakeExifTool) as s:
+        assertEqual(s.get_metadata('good.cr2'), {'SourceFile': 'good.cr2'})
+
+def test_Supervisor_quarantines_failures():
+    directory = tempfile.mkdtemp()
+    try:
+        quarantine = supervisor.Checklist(os.path.join(directory, 'quarantine'))
+        before = FakeExifTool.started
+        with supervisor.Supervisor(FakeExifTool, attempts=2, quarantine=quarantine) as s:
+            assertEqual(s.get_metadata('bad.cr2'), None)
+            assert 'bad.cr2' in quarantine
+            assertEqual(s.stats['exiftool restarts'], 2)
+            # quarantined files are not tried again
+            assertEqual(s.get_metadata('bad.cr2'), None)
+            assertEqual(s.stats['exiftool failures'], 2)
+            assertEqual(s.get_metadata('good.cr2'), {'SourceFile': 'good.cr2'})
+        assertEqual(FakeExifTool.started - before, 3)
+        quarantine.close()
+    finally:
+        shutil.rmtree(directory)
+
+def test_Supervisor_times_out():
+    with supervisor.Supervisor(FakeExifTool, timeout=0.05, attempts=1) as s:
+        assertEqual(s.get_metadata('hang.cr2'), None)
+        assertEqual(s.stats['exiftool timeouts'], 1)
+        assertEqual(s.stats['quarantined'], 1)
+
+def test_Supervisor_kill_ends_stuck_thread():
+    with supervisor.Supervisor(PipeExifTool, timeout=0.05, attempts=1) as s:
+        process = s._et._process
+        assertEqual(s.get_metadata('hang.cr2'), None)
+        assert process.poll() is not None
+        assertEqual(s._worker, None)
+        assertEqual(s.stats['stuck exiftool threads'], 0)
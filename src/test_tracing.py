@@ -0,0 +1,65 @@
+"""
+Tests for tracing
+"""
+import json
+import StringIO
+
+import tracing
+
+
+def assertEqual(actual, expected):
+    assert expected == actual, 'Expected %r, got %r' % (expected, actual)
+
+class Output(StringIO.StringIO):
+    """
+    Keeps what was written after close
+    """
+
+    def close(self):
+        self.written = self.getvalue()
+        StringIO.StringIO.close(self)
+
+def make_clock():
+    ticks = iter(range(1000))
+    return lambda: next(ticks) / 1000.0
+
+def test_Tracer_events():
+    out = Output()
+    with tracing.Tracer(out, clock=make_clock()) as tracer:
+        with tracer.span('scan', glob='*.cr2'):
+            pass
+        trace = tracer.file('a.cr2')
+        with trace.span('file'):
+            with trace.span('crop'):
+                pass
+    events = json.loads(out.written)['traceEvents']
+    assertEqual([e['name'] for e in events], ['scan', 'crop', 'file'])
+    assertEqual([(e['ts'], e['dur']) for e in events],
+                [(1000, 1000), (4000, 1000), (3000, 3000)])
+    assertEqual(events[0]['args'], {'glob': '*.cr2'})
+    assertEqual(events[1]['args'], {'file': 'a.cr2'})
+    assertEqual(set(e['ph'] for e in events), set(['X']))
+
+def test_Tracer_no_events():
+    out = Output()
+    tracing.Tracer(out).close()
+    assertEqual(json.loads(out.written), {'traceEvents': []})
+
+def test_Tracer_sample():
+    out = Output()
+    tracer = tracing.Tracer(out, sample=3)
+    names = ['{}.cr2'.format(i) for i in range(7)]
+    for name in names:
+        with tracer.file(name).span('file'):
+            pass
+    tracer.close()
+    events = json.loads(out.written)['traceEvents']
+    assertEqual([e['args']['file'] for e in events],
+                ['0.cr2', '3.cr2', '6.cr2'])
+
+def test_NULL_TRACE():
+    trace = tracing.NULL_TRACE.file('a.cr2')
+    with trace.span('file'):
+        with tracing.NULL_TRACE.span('scan', glob='*'):
+            pass
+    tracing.NULL_TRACE.close()
@@ -0,0 +1,32 @@
+"""
+Tests for triage
+"""
+import os
+import shutil
+import tempfile
+
+import triage
+
+
+def make_raw(directory, name, content):
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+def test_has_vrd():
+    directory = tempfile.mkdtemp()
+    try:
+        footer = triage.VRD_SIGNATURE + '\0' * (0x40 - len(triage.VRD_SIGNATURE))
+        edited = make_raw(directory, 'edited.cr2', 'II*\0' + 'x' * 100000 + footer)
+        plain = make_raw(directory, 'plain.cr2', 'II*\0' + 'x' * 100000)
+        trailing = make_raw(directory, 'trailing.cr2', 'II*\0' + footer + 'AFCP' * 100)
+        buried = make_raw(directory, 'buried.cr2', 'II*\0' + footer + 'x' * 100000)
+        tiny = make_raw(directory, 'tiny.cr2', '')
+        assert triage.has_vrd(edited)
+        assert not triage.has_vrd(plain)
+        assert triage.has_vrd(trailing)
+        assert not triage.has_vrd(buried)
+        assert not triage.has_vrd(tiny)
+    finally:
+        shutil.rmtree(directory)
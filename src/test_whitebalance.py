@@ -0,0 +1,36 @@
+"""
+Tests for whitebalance
+"""
+import whitebalance
+
+
+def assertEqual(actual, expected):
+    assert expected == actual, 'Expected %r, got %r' % (expected, actual)
+
+MAPPINGS = {0: 'As Shot', 1: 'Daylight', 8: 'Shade', 'Auto': 'As Shot', 'Kelvin': 'Custom'}
+
+def test_WhiteBalanceTable_lookup():
+    table = whitebalance.WhiteBalanceTable(MAPPINGS)
+    assertEqual(len(table.codes), 9)
+    assertEqual(table.lookup(1), 'Daylight')
+    assertEqual(table.lookup(8), 'Shade')
+    assertEqual(table.lookup('8'), 'Shade')
+    assertEqual(table.lookup('Kelvin'), 'Custom')
+    assertEqual(table.lookup(u'Auto'), 'As Shot')
+
+def test_WhiteBalanceTable_unknown():
+    table = whitebalance.WhiteBalanceTable(MAPPINGS)
+    for value in [3, 99, -1, 'Manual', None, True, [1]]:
+        assertEqual(table.find(value), None)
+        assertEqual(table.lookup(value), 'As Shot')
+
+def test_normalize_temperature_and_tint():
+    crs = {'crs:Temperature': '5200.4', 'crs:Tint': -200, 'crs:WhiteBalance': 'Custom'}
+    whitebalance.normalize_temperature_and_tint(crs, [2000, 50000], [-150, 150])
+    assertEqual(crs, {'crs:Temperature': 5200, 'crs:Tint': -150, 'crs:WhiteBalance': 'Custom'})
+    crs = {'crs:Temperature': 0, 'crs:Tint': 'n/a'}
+    whitebalance.normalize_temperature_and_tint(crs, [2000, 50000], [-150, 150])
+    assertEqual(crs, {})
+    crs = {'crs:Temperature': 100000}
+    whitebalance.normalize_temperature_and_tint(crs, [2000, 50000], [-150, 150])
+    assertEqual(crs, {'crs:Temperature': 50000})
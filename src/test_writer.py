@@ -0,0 +1,78 @@
+"""
+Tests for writer
+"""
+import os
+import shutil
+import tempfile
+
+import writer
+
+
+def assertEqual(actual, expected):
+    assert expected == actual, 'Expected %r, got %r' % (expected, actual)
+
+def test_write_atomic_replaces():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'a.xmp')
+        open(path, 'w').write('old')
+        writer.write_atomic(path, 'new')
+        assertEqual(open(path).read(), 'new')
+        assertEqual(os.listdir(directory), ['a.xmp'])
+        assertEqual(os.stat(path).st_mode & 0o777, 0o666 & ~writer.UMASK)
+    finally:
+        shutil.rmtree(directory)
+
+def test_write_atomic_cleans_up():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'a.xmp')
+        try:
+            writer.write_atomic(path, object())
+        except TypeError:
+            pass
+        assertEqual(os.listdir(directory), [])
+    finally:
+        shutil.rmtree(directory)
+
+def test_Writer_threads():
+    directory = tempfile.mkdtemp()
+    try:
+        done = []
+        with writer.Writer(threads=3, queue_size=2, batch=4) as w:
+            for i in range(10):
+                w.write(os.path.join(directory, '%d.xmp' % i), str(i), lambda i=i: done.append(i))
+        assertEqual(sorted(done), range(10))
+        assertEqual(w.stats['written'], 10)
+        assertEqual(w.stats['directory fsyncs'], 3)
+        for i in range(10):
+            assertEqual(open(os.path.join(directory, '%d.xmp' % i)).read(), str(i))
+    finally:
+        shutil.rmtree(directory)
+
+def test_Writer_batches():
+    directory = tempfile.mkdtemp()
+    try:
+        done = []
+        w = writer.Writer(threads=0, batch=2)
+        w.write(os.path.join(directory, 'a.xmp'), 'a', lambda: done.append('a'))
+        # in place straight away; only the directory fsync waits
+        assertEqual(done, ['a'])
+        assertEqual(os.listdir(directory), ['a.xmp'])
+        assertEqual(w.stats['directory fsyncs'], 0)
+        w.write(os.path.join(directory, 'b.xmp'), 'b', lambda: done.append('b'))
+        assertEqual(w.stats['directory fsyncs'], 1)
+        w.write(os.path.join(directory, 'c.xmp'), 'c', lambda: done.append('c'))
+        w.close()
+        assertEqual(done, ['a', 'b', 'c'])
+        assertEqual(sorted(os.listdir(directory)), ['a.xmp', 'b.xmp', 'c.xmp'])
+        assertEqual(w.stats['directory fsyncs'], 2)
+    finally:
+        shutil.rmtree(directory)
+
+def test_Writer_errors():
+    w = writer.Writer(threads=0)
+    w.write('/nonexistent/directory/a.xmp', 'content')
+    w.close()
+    assertEqual(w.stats['write errors'], 1)
+    assertEqual(w.errors[0][0], '/nonexistent/directory/a.xmp')
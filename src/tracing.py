@@ -0,0 +1,142 @@
+"""
+Record where the time goes for individual files.
+
+A Tracer writes spans (scan, extraction, mapping, cache, crop, format,
+write) as Chrome trace events, which chrome://tracing and ui.perfetto.dev
+can open. Only one file in every `sample` is traced, so a trace can be
+taken of a full sized run without slowing it down much. Events are written
+as they happen rather than kept in memory.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class NullSpan(object):
+
+    def __enter__(self):
+        return self
+
+    def set(self, **args):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class NullTrace(object):
+    """
+    Stands in for a Tracer when tracing is off, and for the trace of a file
+    that was not sampled; spans cost next to nothing
+    """
+    _span = NullSpan()
+
+    def file(self, filename):
+        return self
+
+    def span(self, name, **args):
+        return self._span
+
+    def close(self):
+        pass
+
+
+NULL_TRACE = NullTrace()
+
+
+class Span(object):
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = self.tracer.clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.tracer.event(self.name, self.start, self.tracer.clock(),
+                          self.args)
+        return False
+
+    def set(self, **args):
+        """
+        Add args only known once the span is under way, such as a cache hit
+        """
+        self.args.update(args)
+
+
+class FileTrace(object):
+
+    def __init__(self, tracer, filename):
+        self.tracer = tracer
+        self.filename = filename
+
+    def span(self, name, **args):
+        args['file'] = self.filename
+        return Span(self.tracer, name, args)
+
+
+class Tracer(object):
+    """
+    Writes trace events to out, a file opened for writing
+    """
+
+    def __init__(self, out, sample=1, clock=time.time):
+        self.out = out
+        self.sample = max(1, sample)
+        self.clock = clock
+        self.started = clock()
+        self.pid = os.getpid()
+        self.files = 0
+        self.events = 0
+        self._lock = threading.Lock()
+        self.out.write('{"traceEvents": [\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def file(self, filename):
+        """
+        Return the trace for a file: a FileTrace for one file in every
+        sample, NULL_TRACE for the rest
+        """
+        self.files += 1
+        if (self.files - 1) % self.sample:
+            return NULL_TRACE
+        return FileTrace(self, filename)
+
+    def span(self, name, **args):
+        """
+        A span that belongs to the run rather than to one file
+        """
+        return Span(self, name, args)
+
+    def event(self, name, start, end, args):
+        event = {
+            'name': name,
+            'ph': 'X',
+            'ts': int((start - self.started) * 1000000),
+            'dur': int((end - start) * 1000000),
+            'pid': self.pid,
+            'tid': threading.current_thread().ident,
+            'args': args,
+        }
+        line = json.dumps(event, sort_keys=True)
+        with self._lock:
+            if self.events:
+                self.out.write(',\n')
+            self.out.write(line)
+            self.events += 1
+
+    def close(self):
+        with self._lock:
+            self.out.write('\n]}\n')
+            self.out.close()
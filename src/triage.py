@@ -0,0 +1,28 @@
+"""
+Tell whether a raw has DPP edits without asking exiftool.
+
+DPP appends its recipe to the raw as a CanonVRD trailer, which ends with a
+0x40 byte footer starting with the same signature as its header. Other
+tools may append their own trailers after it, so the signature is looked
+for anywhere in the last few kilobytes.
+"""
+
+import os
+
+VRD_SIGNATURE = 'CANON OPTIONAL DATA\0'
+TAIL_SIZE = 8192
+
+# what to do with raws that have no CanonVRD trailer
+NO_VRD_ACTIONS = ('convert', 'skip', 'minimal')
+
+
+def has_vrd(filename, tail_size=TAIL_SIZE):
+    """
+    Look for a CanonVRD trailer with a single seek and read
+    """
+    with open(filename, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - tail_size))
+        tail = f.read(tail_size)
+    return VRD_SIGNATURE in tail
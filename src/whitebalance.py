@@ -0,0 +1,76 @@
+"""
+Resolve white balance settings to crs: values.
+
+exiftool reports white balance either as a numeric code or by name,
+depending on the tag and its options. A WhiteBalanceTable compiles a
+mapping with both kinds of key into a dense list indexed by code and a
+dict of interned names, and falls back to a default for anything it does
+not know.
+"""
+
+import numbers
+
+
+class WhiteBalanceTable(object):
+
+    def __init__(self, mappings, fallback='As Shot'):
+        codes = [k for k in mappings if isinstance(k, numbers.Integral)]
+        self.codes = [None] * (max(codes) + 1 if codes else 0)
+        for code in codes:
+            self.codes[code] = mappings[code]
+        self.names = dict(
+            (intern(k), v) for k, v in mappings.items()
+            if isinstance(k, basestring))
+        self.fallback = fallback
+
+    def find(self, value):
+        """
+        Return the mapping of value, or None if there is none
+        """
+        if isinstance(value, basestring):
+            result = self.names.get(value)
+            if result is None and value.isdigit():
+                return self.find(int(value))
+            return result
+        if isinstance(value, numbers.Integral) and not isinstance(value, bool) \
+                and 0 <= value < len(self.codes):
+            return self.codes[value]
+        return None
+
+    def lookup(self, value):
+        result = self.find(value)
+        if result is None:
+            return self.fallback
+        return result
+
+
+def clamp_int(value, low, high, positive=False):
+    """
+    Round value to an int within [low, high]. Values that are not numbers
+    give None, as do values that are not positive when they must be, which
+    is how cameras record an unknown colour temperature.
+    """
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if positive and value <= 0:
+        return None
+    return int(round(min(max(value, low), high)))
+
+
+def normalize_temperature_and_tint(crs, temperature_range, tint_range):
+    """
+    Normalize crs:Temperature and crs:Tint in a dict of crs: fields in place,
+    dropping values that cannot be used so the defaults apply instead.
+    """
+    for key, (low, high), positive in (
+            ('crs:Temperature', temperature_range, True),
+            ('crs:Tint', tint_range, False)):
+        if key in crs:
+            value = clamp_int(crs[key], low, high, positive)
+            if value is None:
+                del crs[key]
+            else:
+                crs[key] = value
+    return crs
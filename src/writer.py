@@ -0,0 +1,155 @@
+"""
+Write sidecars so a crash never leaves a truncated file behind.
+
+Each file is written to a temporary file next to it, fsynced and renamed
+into place straight away. Directories are fsynced in batches rather than
+once per file, and a few threads do the writing so network filesystems can
+work on several files at once. The queue of pending files is bounded, so
+memory use is too.
+"""
+
+import collections
+import os
+import Queue
+import sys
+import tempfile
+import threading
+
+from tracing import NULL_TRACE
+
+# mkstemp makes files only the owner can read; sidecars should get the same
+# permissions as any other new file.
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+def fsync_directory(directory):
+    """
+    Make renames in directory durable. Not every platform can open a
+    directory, in which case there is nothing to do.
+    """
+    try:
+        fd = os.open(directory or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_atomic(filename, content, fsync=True):
+    directory = os.path.dirname(filename)
+    fd, temp_filename = tempfile.mkstemp(
+        dir=directory or '.', prefix='.' + os.path.basename(filename),
+        suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.chmod(temp_filename, 0o666 & ~UMASK)
+        if os.name == 'nt' and os.path.exists(filename):
+            os.remove(filename)
+        os.rename(temp_filename, filename)
+    except:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        raise
+
+
+class Writer(object):
+    """
+    Writes files from a pool of threads. With threads=0, files are written
+    immediately by the caller.
+    batch is how many files may be renamed into a directory before it is
+    fsynced; every directory is fsynced again on close.
+    """
+
+    def __init__(self, threads=4, queue_size=64, batch=100, fsync=True,
+                 stats=None):
+        self.batch = batch
+        self.fsync = fsync
+        if stats is None:
+            stats = collections.Counter()
+        self.stats = stats
+        self.errors = []
+        self._lock = threading.Lock()
+        self._dirty = collections.Counter()
+        self._queue = Queue.Queue(queue_size)
+        self._threads = []
+        for i in range(threads):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, filename, content, callback=None, trace=NULL_TRACE):
+        """
+        Queue content to be written to filename. callback, if given, is
+        called with no arguments once the file is in place. The write is
+        recorded in trace, on whichever thread does it.
+        """
+        if self._threads:
+            self._queue.put((filename, content, callback, trace))
+        else:
+            self._write(filename, content, callback, trace)
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            finally:
+                self._queue.task_done()
+
+    def _error(self, filename, e):
+        print >> sys.stderr, 'Could not write {}: {}'.format(filename, e)
+        with self._lock:
+            self.errors.append((filename, e))
+            self.stats['write errors'] += 1
+
+    def _write(self, filename, content, callback, trace=NULL_TRACE):
+        directory = os.path.dirname(filename)
+        sync = False
+        with trace.span('write'):
+            try:
+                write_atomic(filename, content, self.fsync)
+            except (IOError, OSError) as e:
+                self._error(filename, e)
+                return
+            with self._lock:
+                self.stats['written'] += 1
+                self._dirty[directory] += 1
+                if self._dirty[directory] >= self.batch:
+                    del self._dirty[directory]
+                    sync = True
+                if callback is not None:
+                    callback()
+            if sync and self.fsync:
+                fsync_directory(directory)
+                with self._lock:
+                    self.stats['directory fsyncs'] += 1
+
+    def close(self):
+        for thread in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self.fsync:
+            for directory in self._dirty:
+                fsync_directory(directory)
+                self.stats['directory fsyncs'] += 1
+        self._dirty.clear()